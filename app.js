@@ -2,8 +2,13 @@
 // Fetches data from API and renders the dashboard
 
 const API_BASE = './cgi-bin/api.py';
+const PAGE_SIZE = 200;    // signals kept in allSignals: the first page of ?action=all
 
 let allSignals = [];
+let serverStats = null;
+let dataVersion = null;   // change-log version of allSignals; null until loaded from the API
+let dataEtag = null;
+let hasMore = false;      // whether the API has rows beyond the loaded page
 let activeFilters = { sector: 'all', type: 'all' };
 let currentSearch = '';
 
@@ -21,27 +26,111 @@ document.addEventListener('DOMContentLoaded', async () => {
 // ===================== DATA =====================
 async function loadData() {
     try {
-        const res = await fetch(`${API_BASE}?action=all`);
+        const [res, stats] = await Promise.all([fetch(`${API_BASE}?action=all&limit=${PAGE_SIZE}`), loadStats()]);
         if (!res.ok) throw new Error('API error');
         const data = await res.json();
         allSignals = data.signals || [];
+        hasMore = Boolean(data.next_cursor);
+        serverStats = stats;
+        dataVersion = data.version ?? null;
+        dataEtag = res.headers.get('ETag');
         document.getElementById('lastUpdated').textContent = `Updated ${formatRelative(new Date())}`;
     } catch (e) {
         // Fallback: use embedded seed data
         allSignals = SEED_DATA;
+        hasMore = false;
+        serverStats = null;
+        dataVersion = null;
         document.getElementById('lastUpdated').textContent = 'Demo mode — seed data';
     }
 }
 
+async function loadStats() {
+    try {
+        const res = await fetch(`${API_BASE}?action=stats`);
+        return res.ok ? await res.json() : null;
+    } catch (e) {
+        return null;
+    }
+}
+
+// Fetch only what changed since dataVersion; returns whether allSignals changed
+async function syncDelta() {
+    const res = await fetch(`${API_BASE}?action=all&since=${dataVersion}`, {
+        cache: 'no-store',
+        headers: dataEtag ? { 'If-None-Match': dataEtag } : {},
+    });
+    if (res.status === 304) return false;
+    if (!res.ok) throw new Error('API error');
+    const delta = await res.json();
+    if (delta.reset) {
+        await loadData();
+        return true;
+    }
+    dataVersion = delta.version;
+    dataEtag = res.headers.get('ETag');
+    const changed = mergeDelta(delta);
+    if (changed) serverStats = await loadStats();
+    return changed;
+}
+
+// Same order as the API's first page: score DESC with missing scores last, then id ASC
+function byRank(a, b) {
+    return (b.score ?? -Infinity) - (a.score ?? -Infinity) || a.id - b.id;
+}
+
+function mergeDelta(delta) {
+    const gone = new Set(delta.deleted || []);
+    const changed = new Map([...(delta.inserted || []), ...(delta.updated || [])].map(s => [s.id, s]));
+    if (!gone.size && !changed.size) return false;
+    // Rows that weren't loaded only join the page if they rank above its current last row
+    const tail = allSignals[allSignals.length - 1];
+    const last = hasMore && tail ? { score: tail.score, id: tail.id } : null;
+    // Compact in place: drop deleted rows and patch loaded ones
+    let kept = 0;
+    for (const s of allSignals) {
+        if (gone.has(s.id)) continue;
+        const patch = changed.get(s.id);
+        if (patch) {
+            delete s.raw_text; // re-fetched on demand by the modal
+            Object.assign(s, patch);
+            changed.delete(s.id);
+        }
+        allSignals[kept++] = s;
+    }
+    allSignals.length = kept;
+    for (const s of changed.values()) {
+        if (!last || byRank(s, last) < 0) allSignals.push(s);
+    }
+    allSignals.sort(byRank);
+    if (allSignals.length > PAGE_SIZE) {
+        allSignals.length = PAGE_SIZE;
+        hasMore = true;
+    }
+    return true;
+}
+
 async function refreshData() {
     const btn = document.querySelector('.refresh-btn');
     btn.style.opacity = '0.5';
     btn.style.pointerEvents = 'none';
-    await loadData();
-    applyFilters();
-    renderSectorsTab();
-    renderPlatformsTab();
-    updateStats();
+    let changed = true;
+    if (dataVersion === null) {
+        await loadData();
+    } else {
+        try {
+            changed = await syncDelta();
+            document.getElementById('lastUpdated').textContent = `Updated ${formatRelative(new Date())}`;
+        } catch (e) {
+            changed = false;
+        }
+    }
+    if (changed) {
+        applyFilters();
+        renderSectorsTab();
+        renderPlatformsTab();
+        updateStats();
+    }
     setTimeout(() => {
         btn.style.opacity = '1';
         btn.style.pointerEvents = 'auto';
@@ -187,10 +276,17 @@ function renderPlatformsTab() {
 
 // ===================== STATS =====================
 function updateStats() {
-    animateCount('statTotal', allSignals.length);
-    animateCount('statHigh', allSignals.filter(s => s.priority === 'High').length);
-    animateCount('statSectors', new Set(allSignals.map(s => s.sector)).size);
-    animateCount('statPlatforms', new Set(allSignals.map(s => s.platform)).size);
+    // Prefer the server rollup; it covers every signal, not just the loaded page
+    const stats = serverStats && !serverStats.error ? serverStats : {
+        total: allSignals.length,
+        high_priority: allSignals.filter(s => s.priority === 'High').length,
+        sectors: new Set(allSignals.map(s => s.sector)).size,
+        platforms: new Set(allSignals.map(s => s.platform)).size,
+    };
+    animateCount('statTotal', stats.total);
+    animateCount('statHigh', stats.high_priority);
+    animateCount('statSectors', stats.sectors);
+    animateCount('statPlatforms', stats.platforms);
 }
 
 function animateCount(id, target) {
@@ -205,9 +301,32 @@ function animateCount(id, target) {
 }
 
 // ===================== MODAL =====================
+let modalSignalId = null;
+
 function openModal(id) {
     const s = allSignals.find(x => x.id === id);
     if (!s) return;
+    modalSignalId = id;
+    renderModal(s);
+    document.getElementById('modalOverlay').classList.add('open');
+    // List endpoints omit heavy columns (raw_text); fetch the full row on demand
+    if (!('raw_text' in s)) loadSignalDetail(s);
+}
+
+async function loadSignalDetail(s) {
+    try {
+        const res = await fetch(`${API_BASE}?action=signal&id=${s.id}`);
+        if (!res.ok) return;
+        const data = await res.json();
+        if (!data.signal) return;
+        Object.assign(s, data.signal);
+        if (modalSignalId === s.id) renderModal(s);
+    } catch (e) {
+        // Keep the summary-only modal
+    }
+}
+
+function renderModal(s) {
     const typeColors = { trending: 'var(--gold)', pain_point: 'var(--red)', opportunity: 'var(--green)', mention: 'var(--blue)' };
     const typeBg = { trending: 'var(--gold-dim)', pain_point: 'var(--red-dim)', opportunity: 'var(--green-dim)', mention: 'var(--blue-dim)' };
     document.getElementById('modalBody').innerHTML = `
@@ -255,10 +374,10 @@ function openModal(id) {
         ` : ''}
         ${s.source_url ? `<a href="${s.source_url}" target="_blank" rel="noopener" class="modal-source-link">View Original Source ↗</a>` : ''}
     `;
-    document.getElementById('modalOverlay').classList.add('open');
 }
 
 function closeModal() {
+    modalSignalId = null;
     document.getElementById('modalOverlay').classList.remove('open');
 }
 
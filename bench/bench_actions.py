@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Per-action regression suite: seeds fixed-seed synthetic databases at 10k/100k/1M signals, times every
+read action through api.handle_read and compares p50 latency and row counts with bench/baseline.json
+Usage: python bench/bench_actions.py [--sizes 10000,100000,1000000] [--repeat 30] [--record] [--tolerance 0.5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from common import api, build_db, percentile, timed
+
+import instrument
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SEED = 42
+
+def cases(conn, n):
+    """Fixed requests per action; anything derived from the data is deterministic for a given seed."""
+    first = api.handle_action(conn, 'all', {"limit": "50"})
+    version = api.get_version(conn)
+    return {
+        "all": {"action": "all", "limit": "50"},
+        "all_page2": {"action": "all", "limit": "50", "cursor": first['next_cursor']},
+        "all_since": {"action": "all", "since": str(max(0, version - 100))},
+        "sector": {"action": "sector", "sector": "Fintech", "limit": "50"},
+        "platform": {"action": "platform", "platform": "Reddit", "limit": "50"},
+        "search": {"action": "search", "q": "halal delivery", "limit": "50"},
+        "search_like": {"action": "search", "q": "halal", "mode": "like", "limit": "50"},
+        "signal": {"action": "signal", "id": str(n // 2)},
+        "stats": {"action": "stats"},
+        "timeseries": {"action": "timeseries", "by": "sector", "days": "30", "until": "2026-03-01"},
+        "trending": {"action": "trending", "dim": "all", "window": "7d"},
+    }
+
+def run_case(conn, params, repeat):
+    action = params['action']
+    phases, rows = {}, 0
+
+    def once():
+        nonlocal rows
+        api.start_profile(action, params)
+        status, _, payload = api.handle_read(conn, action, params, {})
+        profile = instrument.finish(status, len(payload))
+        for name, seconds in profile.phases.items():
+            phases[name] = phases.get(name, 0.0) + seconds
+        rows = profile.rows
+        return payload
+
+    once()  # warm the page cache and statement cache
+    phases.clear()
+    latencies, payload = timed(once, repeat)
+    return {"p50_ms": round(percentile(latencies, 50), 3), "p99_ms": round(percentile(latencies, 99), 3),
+            "rows": rows, "bytes": len(payload),
+            "phases_ms": {k: round(v / repeat * 1000, 3) for k, v in sorted(phases.items())}}
+
+def compare(size, name, result, baseline, tolerance, floor_ms):
+    """Regressions for one case: p50 beyond tolerance (and the noise floor), or a different row count."""
+    base = baseline.get(str(size), {}).get(name)
+    if not base:
+        return []
+    problems = []
+    if result['p50_ms'] > base['p50_ms'] * (1 + tolerance) and result['p50_ms'] - base['p50_ms'] > floor_ms:
+        problems.append(f"p50 {result['p50_ms']:.2f}ms vs baseline {base['p50_ms']:.2f}ms")
+    if result['rows'] != base['rows']:
+        problems.append(f"rows {result['rows']} vs baseline {base['rows']}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--only', default='', help='comma-separated case names')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'market_intel_bench'),
+                        help='where seeded databases are cached between runs')
+    parser.add_argument('--rebuild', action='store_true', help='reseed even when a cached database exists')
+    parser.add_argument('--record', action='store_true', help=f'write results to {os.path.relpath(BASELINE)}')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed p50 slowdown (0.5 = +50%%)')
+    parser.add_argument('--floor-ms', type=float, default=1.0, help='ignore slowdowns smaller than this')
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    only = {s for s in args.only.split(',') if s}
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, encoding='utf-8') as f:
+            baseline = json.load(f)
+    os.makedirs(args.data_dir, exist_ok=True)
+    regressions = 0
+    for size in sizes:
+        path = os.path.join(args.data_dir, f'signals_{size}_seed{SEED}.db')
+        if args.rebuild or not os.path.exists(path):
+            print(f'seeding {size:,} signals into {path} ...', flush=True)
+            # Seed under a temporary name so an interrupted run never leaves a partial database cached
+            os.replace(build_db(path + '.partial', size, SEED), path)
+        api.DB_PATH = path
+        api.init_db()
+        conn = api.get_db()
+        conn.execute('PRAGMA query_only = 1')
+        results = {}
+        print(f'\n{size:,} signals')
+        print(f'{"case":<12} {"p50 ms":>9} {"p99 ms":>9} {"rows":>6} {"bytes":>8}  phases (mean ms)')
+        for name, params in cases(conn, size).items():
+            if only and name not in only:
+                continue
+            result = results[name] = run_case(conn, params, args.repeat)
+            phases = ' '.join(f'{k}={v:.2f}' for k, v in result['phases_ms'].items())
+            problems = [] if args.record else compare(size, name, result, baseline, args.tolerance, args.floor_ms)
+            regressions += bool(problems)
+            print(f'{name:<12} {result["p50_ms"]:>9.2f} {result["p99_ms"]:>9.2f} {result["rows"]:>6} '
+                  f'{result["bytes"]:>8}  {phases}' + (f'  REGRESSION: {"; ".join(problems)}' if problems else ''))
+        conn.close()
+        baseline.setdefault(str(size), {}).update(results)
+
+    if args.record:
+        with open(BASELINE, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'\nrecorded baseline in {BASELINE}')
+    elif regressions:
+        print(f'\n{regressions} case(s) regressed against {BASELINE}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
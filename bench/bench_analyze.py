@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Analysis benchmark against the mock completions server: the workflow's sequential
+batches of 10 with a 2s wait vs analyze.py (prefilter, cache, token-budgeted concurrent batches)
+Usage: python bench/bench_analyze.py [--posts 400] [--dup-rate 0.2] [--wait 2.0] [--rps 4]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from common import api, free_port, synthetic_signals
+
+import analyze
+from mock_completions import serve
+
+def synthetic_posts(n, dup_rate, seed):
+    """Relevant posts plus near-empty, off-topic and cross-platform copies."""
+    rnd = random.Random(seed)
+    cities = ['Dubai', 'Abu Dhabi', 'Sharjah', 'UAE']
+    posts = []
+    for i, s in enumerate(synthetic_signals(n, seed)):
+        roll = rnd.random()
+        if posts and roll < dup_rate:
+            posts.append(dict(rnd.choice(posts), source=rnd.choice(['Reddit', 'X', 'News']),
+                              url=f'https://example.com/copy/{seed}/{i}'))
+            continue
+        if roll < dup_rate + 0.08:
+            title, body = rnd.choice(['lol', 'same', 'this', '+1 agreed']), ''
+        elif roll < dup_rate + 0.16:
+            title, body = s[0], s[2]
+        else:
+            title, body = f'{s[0]} in {rnd.choice(cities)}', f'{s[10]} prices keep going up'
+        posts.append({"source": "Reddit", "subreddit": "", "title": title, "body": body, "score": s[7],
+                      "url": f'https://example.com/p/{seed}/{i}'})
+    return posts
+
+def baseline(client, posts, wait):
+    """Workflow 2 today: every post, fixed batches of 10, one at a time, then a fixed wait."""
+    t0 = time.perf_counter()
+    tokens = requests = 0
+    for i in range(0, len(posts), 10):
+        while True:
+            try:
+                _, usage = client.analyze(posts[i:i + 10])
+                break
+            except analyze.RateLimited as e:
+                time.sleep(e.retry_after or 1)
+        tokens += usage.get('total_tokens', 0)
+        requests += 1
+        time.sleep(wait)
+    return time.perf_counter() - t0, tokens, requests
+
+def report(name, m):
+    print(f'{name:<12} {m["wall_seconds"]:>8.2f}s  batches={m["batches"]:<4} tokens={m["tokens_used"]:<8} '
+          f'hit_rate={m["hit_rate"]:.2f} saved(cache)={m["tokens_saved_cache"]} saved(filter)={m["tokens_saved_filter"]} '
+          f'filtered={m["filtered"]} throttled={m["throttled"]}')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=400)
+    parser.add_argument('--dup-rate', type=float, default=0.2)
+    parser.add_argument('--wait', type=float, default=2.0, help='fixed wait between baseline batches')
+    parser.add_argument('--latency', type=float, default=0.8, help='mock seconds per request')
+    parser.add_argument('--rps', type=int, default=4, help='mock requests per second before 429s')
+    parser.add_argument('--concurrency', type=int, default=analyze.CONCURRENCY)
+    parser.add_argument('--skip-baseline', action='store_true')
+    args = parser.parse_args()
+
+    port = free_port()
+    server, state = serve(port, args.latency, args.rps)
+    client = analyze.CompletionClient(f'http://127.0.0.1:{port}/v1', api_key='mock')
+    posts = synthetic_posts(args.posts, args.dup_rate, 1)
+    print(f'{len(posts)} posts, mock latency {args.latency}s, {args.rps} req/s limit')
+
+    if not args.skip_baseline:
+        elapsed, tokens, requests = baseline(client, posts, args.wait)
+        print(f'{"baseline":<12} {elapsed:>8.2f}s  batches={requests:<4} tokens={tokens}')
+
+    api.DB_PATH = os.path.join(tempfile.mkdtemp(), 'analyze.db')
+    api.init_db()
+    conn = api.get_db()
+    cold = analyze.run_analysis(conn, [dict(p) for p in posts], client, args.concurrency)
+    report('cold cache', cold['metrics'])
+    # Next day: the same posts re-scraped plus a quarter new ones
+    next_day = [dict(p) for p in posts] + synthetic_posts(args.posts // 4, args.dup_rate, 2)
+    warm = analyze.run_analysis(conn, next_day, client, args.concurrency)
+    report('warm cache', warm['metrics'])
+    conn.close()
+    print(f'mock: {state.stats}')
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
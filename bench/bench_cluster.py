@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Clustering benchmark: MinHash/LSH throughput and planted near-duplicate recall at 100k+ posts
+Usage: python bench/bench_cluster.py [--posts 100000] [--paraphrase-rate 0.2] [--incremental 10000]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from common import api, synthetic_signals
+
+import cluster
+import ingest
+
+def paraphrase(text, rnd, rate=0.1):
+    words = text.split()
+    for _ in range(max(1, int(len(words) * rate))):
+        i = rnd.randrange(len(words))
+        op = rnd.random()
+        if op < 0.4:
+            words[i] = words[rnd.randrange(len(words))]
+        elif op < 0.7:
+            del words[i]
+        else:
+            words.insert(i, rnd.choice(words))
+    return ' '.join(words)
+
+def synthetic_posts(n, rate, seed):
+    """Posts where `rate` of them paraphrase an earlier post; returns posts and the planted group per post."""
+    rnd = random.Random(seed)
+    posts, group = [], []
+    for i, s in enumerate(synthetic_signals(n, seed)):
+        if posts and rnd.random() < rate:
+            j = rnd.randrange(len(posts))
+            posts.append(dict(posts[j], body=paraphrase(posts[j]['body'], rnd), url=f'https://example.com/p/{seed}/{i}'))
+            group.append(group[j])
+        else:
+            posts.append({"source": "Reddit", "title": s[0], "body": s[10], "url": f'https://example.com/p/{seed}/{i}',
+                          "score": s[7], "comments": s[8], "collected_at": f'{s[12]}T19:00:00Z'})
+            group.append((seed, i))
+    return posts, group
+
+def recall(conn, groups):
+    """Share of planted duplicate pairs (post, its original) that ended up in the same cluster."""
+    cluster_of = dict(conn.execute("SELECT item_id, cluster_id FROM cluster_items WHERE item_type = 'post'"))
+    first, hits, pairs = {}, 0, 0
+    for post_id, g in groups:
+        if g in first:
+            pairs += 1
+            hits += cluster_of.get(post_id) == cluster_of.get(first[g])
+        else:
+            first[g] = post_id
+    return hits / pairs if pairs else 1.0
+
+def load(conn, posts, groups, start_id):
+    ingest.ingest_posts(conn, ((i, p) for i, p in enumerate(posts, 1)))
+    return [(start_id + i, g) for i, g in enumerate(groups)]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--paraphrase-rate', type=float, default=0.2)
+    parser.add_argument('--incremental', type=int, default=10000)
+    parser.add_argument('--threshold', type=float, default=cluster.THRESHOLD)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    api.DB_PATH = os.path.join(tempfile.mkdtemp(), 'cluster.db')
+    api.init_db()
+    conn = api.get_db()
+    conn.execute('DELETE FROM signals')
+    conn.commit()
+
+    t0 = time.perf_counter()
+    sig_posts, _ = synthetic_posts(2000, 0, 99)
+    sig_time = time.perf_counter()
+    for p in sig_posts:
+        cluster.signature(p['title'] + ' ' + p['body'])
+    print(f'signature: {len(sig_posts) / (time.perf_counter() - sig_time):,.0f} docs/s (setup {sig_time - t0:.1f}s)')
+
+    posts, groups = synthetic_posts(args.posts, args.paraphrase_rate, 1)
+    labelled = load(conn, posts, groups, 1)
+    report = cluster.update_clusters(conn, args.threshold, workers=args.workers)
+    clusters = conn.execute('SELECT COUNT(*), MAX(size) FROM clusters').fetchone()
+    print(f'full run:    {report["posts"]:>8} posts {report["seconds"]:>8.2f}s {report["items_per_sec"]:>10,.0f} posts/s '
+          f'clusters={clusters[0]} largest={clusters[1]} recall={recall(conn, labelled):.3f}')
+
+    if args.incremental:
+        more, more_groups = synthetic_posts(args.incremental, args.paraphrase_rate, 2)
+        labelled += load(conn, more, more_groups, len(posts) + 1)
+        report = cluster.update_clusters(conn, args.threshold, workers=args.workers)
+        print(f'incremental: {report["posts"]:>8} posts {report["seconds"]:>8.2f}s {report["items_per_sec"]:>10,.0f} posts/s '
+              f'recall={recall(conn, labelled):.3f}')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
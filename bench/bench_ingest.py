@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Ingestion benchmark: batched upsert (ingest.py) vs one-row-per-commit inserts
+Usage: python bench/bench_ingest.py [--posts 100000] [--dup-rate 0.2]
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import api, synthetic_signals
+
+import ingest
+
+def synthetic_posts(n, dup_rate, seed=7):
+    rnd = random.Random(seed)
+    sources = ['Reddit', 'X', 'News']
+    posts = []
+    for i, s in enumerate(synthetic_signals(n, seed)):
+        if posts and rnd.random() < dup_rate:
+            posts.append(dict(rnd.choice(posts), score=rnd.randint(0, 500)))  # re-scraped post
+            continue
+        posts.append({"source": rnd.choice(sources), "subreddit": "", "title": s[0], "body": s[10][:2000],
+                      "author": f"user{i}", "score": s[7], "comments": s[8], "url": s[11], "language": "",
+                      "collected_at": f"{s[12]}T19:00:00Z"})
+    return posts
+
+def fresh_db(path):
+    api.DB_PATH = path
+    api.init_db()
+    return api.get_db()
+
+def per_row(conn, posts):
+    # Baseline: the seed_data pattern, one INSERT and one commit per row
+    t0 = time.perf_counter()
+    for p in posts:
+        conn.execute(ingest.UPSERT_SQL, ingest.prepare_post(p))
+        conn.commit()
+    return time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--dup-rate', type=float, default=0.2)
+    parser.add_argument('--baseline-posts', type=int, default=5000, help='rows for the per-row baseline (it is slow)')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    posts = synthetic_posts(args.posts, args.dup_rate)
+    payload = '\n'.join(json.dumps(p, ensure_ascii=False) for p in posts).encode('utf-8')
+    print(f'{len(posts)} posts, {len(payload) / 1e6:.1f} MB NDJSON, dup rate {args.dup_rate}')
+
+    conn = fresh_db(os.path.join(tmp, 'batched.db'))
+    report = ingest.ingest_stream(conn, io.BytesIO(payload))
+    stored = conn.execute('SELECT COUNT(*), SUM(mentions) FROM raw_posts').fetchone()
+    print(f'batched     {report["rows_per_sec"]:>12,.0f} rows/s  inserted={report["inserted"]} '
+          f'updated={report["updated"]} stored={stored[0]} mentions={stored[1]}')
+    report = ingest.ingest_stream(conn, io.BytesIO(payload))
+    print(f're-run      {report["rows_per_sec"]:>12,.0f} rows/s  inserted={report["inserted"]} updated={report["updated"]}')
+    conn.close()
+
+    conn = fresh_db(os.path.join(tmp, 'per_row.db'))
+    conn.execute('PRAGMA journal_mode = DELETE')
+    sample = posts[:args.baseline_posts]
+    elapsed = per_row(conn, sample)
+    print(f'per-row     {len(sample) / elapsed:>12,.0f} rows/s  ({len(sample)} rows, rollback journal)')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Pagination benchmark: keyset pages at increasing depth vs LIMIT/OFFSET, plus response size per projection
+Usage: python bench/bench_pagination.py [--rows 1000000] [--repeat 10] [--db existing.db]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+from common import api, build_db, percentile, timed
+
+DEPTHS = [0, 10, 100, 1000, 4000]
+
+def cursor_at(conn, filters, args, offset):
+    # Setup only: find the row ending the page before `offset` and encode it as a cursor
+    where = 'WHERE ' + ' AND '.join(filters) if filters else ''
+    row = conn.execute(f'SELECT score, id FROM signals {where} ORDER BY score DESC, id ASC LIMIT 1 OFFSET ?',
+                       list(args) + [offset - 1]).fetchone()
+    return api.encode_cursor(row['score'], row['id']) if row else None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--db', help='reuse an existing benchmark database instead of building one')
+    args = parser.parse_args()
+
+    db = args.db or build_db(os.path.join(tempfile.mkdtemp(), 'pagination.db'), args.rows)
+    api.DB_PATH = db
+    api.init_db()
+    conn = api.get_db()
+    total = conn.execute('SELECT COUNT(*) FROM signals').fetchone()[0]
+    size = api.DEFAULT_PAGE_SIZE
+    print(f'{total} signals, page size {size}')
+    print(f'{"action":<10}{"page":>7}{"keyset p50":>13}{"offset p50":>13}{"bytes default":>15}{"bytes all":>12}')
+
+    cases = [('all', [], [], {}), ('sector', ['sector = ?'], ['Fintech'], {'sector': 'Fintech'})]
+    for action, filters, fargs, params in cases:
+        where = 'WHERE ' + ' AND '.join(filters) if filters else ''
+        matching = conn.execute(f'SELECT COUNT(*) FROM signals {where}', fargs).fetchone()[0]
+        for depth in [d for d in DEPTHS if d * size < matching] + [(matching - 1) // size]:
+            offset = depth * size
+            cursor = cursor_at(conn, filters, fargs, offset) if offset else None
+            page = dict(params, action=action, **({'cursor': cursor} if cursor else {}))
+            keyset_ms, result = timed(lambda: api.handle_action(conn, action, page), args.repeat)
+            offset_ms, _ = timed(lambda: [api.row_to_signal(r) for r in conn.execute(
+                f'SELECT {", ".join(api.DEFAULT_FIELDS)} FROM signals {where} ORDER BY score DESC, id ASC LIMIT ? OFFSET ?',
+                fargs + [size, offset]).fetchall()], args.repeat)
+            full = api.handle_action(conn, action, dict(page, fields='all'))
+            print(f'{action:<10}{depth:>7}{percentile(keyset_ms, 50):>11.2f}ms{percentile(offset_ms, 50):>11.2f}ms'
+                  f'{len(json.dumps(result, ensure_ascii=False, indent=2).encode()):>15}'
+                  f'{len(json.dumps(full, ensure_ascii=False, indent=2).encode()):>12}')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
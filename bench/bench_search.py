@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Search benchmark: FTS5/BM25 path vs the legacy four-column LIKE scan as the corpus grows
+Usage: python bench/bench_search.py [--sizes 1000,10000,100000] [--repeat 10]
+"""
+
+import argparse
+import os
+import tempfile
+
+from common import api, build_db, percentile, timed
+
+QUERIES = ['halal', 'delivery logistics', 'fintech', 'الصحة', 'zzzz']
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    print(f'{"rows":>9}  {"query":<20}{"hits":>8}{"like p50":>11}{"fts p50":>11}{"speedup":>9}')
+    for n in [int(x) for x in args.sizes.split(',')]:
+        conn = api.sqlite3.connect(build_db(os.path.join(tmp, f'search_{n}.db'), n))
+        conn.row_factory = api.sqlite3.Row
+        for q in QUERIES:
+            like_ms, _ = timed(lambda: api.search_signals(conn, q, mode='like', limit=api.MAX_PAGE_SIZE), args.repeat)
+            fts_ms, (hits, _) = timed(lambda: api.search_signals(conn, q, limit=api.MAX_PAGE_SIZE), args.repeat)
+            like50, fts50 = percentile(like_ms, 50), percentile(fts_ms, 50)
+            print(f'{n:>9}  {q:<20}{len(hits):>8}{like50:>9.2f}ms{fts50:>9.2f}ms{like50 / max(fts50, 1e-6):>8.1f}x')
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Load test: per-request CGI (api.py) vs the persistent server (server.py)
+Reports requests/sec and p50/p99 latency for each action.
+Usage: python bench/bench_server.py [--requests 200] [--concurrency 8] [--rows 25]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from common import ROOT, build_db, free_port, percentile, wait_for
+
+CGI_LAUNCHER = '''
+import sys
+from http.server import CGIHTTPRequestHandler, ThreadingHTTPServer
+class Handler(CGIHTTPRequestHandler):
+    have_fork = False  # run api.py through sys.executable, one interpreter per request
+    def log_message(self, *args):
+        pass
+ThreadingHTTPServer(('127.0.0.1', int(sys.argv[1])), Handler).serve_forever()
+'''
+
+ACTIONS = ['action=all', 'action=stats', 'action=sector&sector=Fintech', 'action=search&q=halal']
+
+def start_cgi(port, env):
+    return subprocess.Popen([sys.executable, '-c', CGI_LAUNCHER, str(port)], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def start_persistent(port, env):
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, 'cgi-bin', 'server.py'), '--port', str(port)],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def load(url, requests, concurrency):
+    def one(_):
+        t0 = time.perf_counter()
+        urllib.request.urlopen(url, timeout=30).read()
+        return (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as ex:
+        latencies = list(ex.map(one, range(requests)))
+    elapsed = time.perf_counter() - t0
+    return requests / elapsed, percentile(latencies, 50), percentile(latencies, 99)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=25, help='synthetic signals in the benchmark DB')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    db = build_db(os.path.join(tmp, 'bench.db'), args.rows)
+    env = dict(os.environ, MARKET_INTEL_DB=db)
+
+    print(f'{"path":<12}{"query":<36}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}')
+    for name, start, path in (('cgi', start_cgi, '/cgi-bin/api.py'), ('persistent', start_persistent, '/')):
+        port = free_port()
+        proc = start(port, env)
+        try:
+            wait_for(f'http://127.0.0.1:{port}{path}?action=stats')
+            for query in ACTIONS:
+                rps, p50, p99 = load(f'http://127.0.0.1:{port}{path}?{query}', args.requests, args.concurrency)
+                print(f'{name:<12}{query:<36}{rps:>10.1f}{p50:>10.2f}{p99:>10.2f}')
+        finally:
+            proc.terminate()
+            proc.wait()
+
+if __name__ == '__main__':
+    main()
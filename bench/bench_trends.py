@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Trend benchmark: ?action=trending from the trigger-maintained windows vs recounting the full
+history, plus the insert cost of the triggers and whether a planted burst ranks first
+Usage: python bench/bench_trends.py [--rows 100000] [--burst 200] [--repeat 20]
+"""
+
+import argparse
+import math
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from common import api, build_db, percentile, synthetic_signals, timed
+
+PLANTED = 'planted burst topic'
+
+def plant_burst(conn, n, seed=5):
+    """n signals carrying one new keyword, spread over the last three collected days."""
+    rnd = random.Random(seed)
+    last = date.fromisoformat(conn.execute('SELECT MAX(date_collected) FROM signals').fetchone()[0])
+    conn.executemany('''INSERT INTO signals (title, type, sector, platform, priority, score, mentions, keywords, date_collected)
+        VALUES (?,?,?,?,?,?,?,?,?)''',
+        [(f'Burst {i}', 'trending', 'Fintech', 'Reddit', 'Medium', rnd.randint(1, 100), rnd.randint(0, 50),
+          f'{PLANTED},fintech uae', (last - timedelta(days=rnd.randrange(3))).isoformat()) for i in range(n)])
+    conn.commit()
+
+def full_recount(conn, limit=20):
+    """Baseline: rebuild the keyword windows from every signal on each request."""
+    rows = conn.execute('SELECT keywords, date_collected FROM signals').fetchall()
+    as_of = max(r[1] for r in rows if r[1])
+    week, month = [(date.fromisoformat(as_of) - timedelta(days=d)).isoformat() for d in (7, 28)]
+    d7, d28 = Counter(), Counter()
+    for keywords, day in rows:
+        if not day or day <= month:
+            continue
+        terms = {k.strip().lower() for k in (keywords or '').split(',') if k.strip()}
+        d28.update(terms)
+        if day > week:
+            d7.update(terms)
+    scores = []
+    for term, count in d7.items():
+        expected = (d28[term] - count) / 21 * 7
+        scores.append(((count - expected) / math.sqrt(expected + 1), term))
+    return sorted(scores, reverse=True)[:limit]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--burst', type=int, default=200, help='planted signals in the last 3 days')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    tmp = tempfile.mkdtemp()
+
+    t0 = time.perf_counter()
+    db = build_db(os.path.join(tmp, 'trends.db'), args.rows)
+    with_triggers = time.perf_counter() - t0
+    conn = api.get_db()
+    windows = conn.execute('SELECT COUNT(*) FROM trend_windows').fetchone()[0]
+    buckets = conn.execute('SELECT COUNT(*) FROM trend_buckets').fetchone()[0]
+    conn.close()
+
+    # Same load without the trend triggers, to price them
+    api.DB_PATH = os.path.join(tmp, 'plain.db')
+    api.init_db()
+    conn = api.get_db()
+    for name in api.TREND_TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+    conn.commit()
+    t0 = time.perf_counter()
+    conn.executemany('''INSERT INTO signals
+        (title, arabic_title, summary, type, sector, platform, priority, score, mentions, keywords, raw_text, source_url, date_collected)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)''', synthetic_signals(args.rows))
+    conn.commit()
+    conn.close()
+    without_triggers = time.perf_counter() - t0
+    print(f'{args.rows} signals: insert {args.rows / with_triggers:,.0f} rows/s with trend triggers, '
+          f'{args.rows / without_triggers:,.0f} rows/s without ({buckets} buckets, {windows} window rows)')
+
+    api.DB_PATH = db
+    conn = api.get_db()
+    plant_burst(conn, args.burst)
+    lat, result = timed(lambda: api.get_trending(conn, 'keyword', '7d', 20), args.repeat)
+    rank = next((i for i, t in enumerate(result['topics'], 1) if t['term'] == PLANTED), None)
+    print(f'trending (windows)  p50={percentile(lat, 50):8.2f}ms p99={percentile(lat, 99):8.2f}ms  planted rank={rank}')
+    lat, result = timed(lambda: full_recount(conn), max(1, args.repeat // 4))
+    rank = next((i for i, (_, term) in enumerate(result, 1) if term == PLANTED), None)
+    print(f'full recount        p50={percentile(lat, 50):8.2f}ms p99={percentile(lat, 99):8.2f}ms  planted rank={rank}')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Consistency check for the trigger-maintained tables: applies a random mix of inserts, updates
+and deletes, then compares the incremental state with a from-scratch recount of signals
+Usage: python bench/check_triggers.py [--rows 5000] [--ops 2000] [--seed 7]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+from common import api, build_db, synthetic_signals
+
+def mutate(conn, ops, seed):
+    """Random writes, including NULL dimensions, moved and far-future dates, and emptying the newest day."""
+    rnd = random.Random(seed)
+    fresh = synthetic_signals(ops, seed + 1)
+    ids = [r[0] for r in conn.execute('SELECT id FROM signals')]
+    for _ in range(ops):
+        roll = rnd.random()
+        if roll < 0.4 or not ids:
+            row = list(next(fresh))
+            if rnd.random() < 0.1:
+                row[4] = None  # sector
+            cur = conn.execute('''INSERT INTO signals
+                (title, arabic_title, summary, type, sector, platform, priority, score, mentions, keywords, raw_text, source_url, date_collected)
+                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)''', row)
+            ids.append(cur.lastrowid)
+        elif roll < 0.75:
+            sid = rnd.choice(ids)
+            column, value = rnd.choice([
+                ('sector', rnd.choice(['Fintech', 'Retail', None])),
+                ('platform', rnd.choice(['Reddit', 'News'])),
+                ('priority', rnd.choice(['High', 'Low'])),
+                ('type', rnd.choice(['trending', 'mention'])),
+                ('date_collected', f'2026-0{rnd.randint(1, 3)}-{rnd.randint(10, 28)}'),
+                ('date_collected', rnd.choice(['2062-02-23', 'not a date', None])),
+                ('keywords', 'fintech uae,new topic'),
+                ('mentions', rnd.randint(0, 500)),
+            ])
+            conn.execute(f'UPDATE signals SET {column} = ? WHERE id = ?', (value, sid))
+        elif roll < 0.97:
+            sid = ids.pop(rnd.randrange(len(ids)))
+            conn.execute('DELETE FROM signals WHERE id = ?', (sid,))
+        else:
+            newest = conn.execute(f'SELECT {api.TREND_AS_OF}').fetchone()[0]
+            conn.execute('DELETE FROM signals WHERE substr(date_collected, 1, 10) = ?', (newest,))
+            ids = [r[0] for r in conn.execute('SELECT id FROM signals')]
+    conn.commit()
+
+def check_rollups(conn):
+    problems = []
+    for table, extra in api.ROLLUP_TABLES.items():
+        keys = extra + api.ROLLUP_DIMENSIONS
+        cols = ', '.join(keys)
+        stored = set(map(tuple, conn.execute(f'SELECT {cols}, signals FROM {table}')))
+        recount = set(map(tuple, conn.execute(f'''SELECT {', '.join(api._rollup_keys('', extra))}, COUNT(*) FROM signals
+            GROUP BY {', '.join(str(i + 1) for i in range(len(keys)))}''')))
+        if stored != recount:
+            problems.append(f'{table}: {len(stored ^ recount)} rows differ from a recount')
+    # stats against the original five scans over signals
+    c = conn.cursor()
+    scans = {
+        "total": c.execute('SELECT COUNT(*) FROM signals').fetchone()[0],
+        "high_priority": c.execute("SELECT COUNT(*) FROM signals WHERE priority='High'").fetchone()[0],
+        "sectors": c.execute("SELECT COUNT(DISTINCT NULLIF(sector, '')) FROM signals").fetchone()[0],
+        "platforms": c.execute("SELECT COUNT(DISTINCT NULLIF(platform, '')) FROM signals").fetchone()[0],
+        "by_type": {r[0]: r[1] for r in c.execute("SELECT NULLIF(type, ''), COUNT(*) FROM signals GROUP BY 1")},
+    }
+    stats = api.get_stats(conn)
+    if stats != scans:
+        problems.append(f'stats {stats} != scans {scans}')
+    return problems
+
+def check_trends(conn):
+    """Trigger-maintained buckets, windows and as_of against rebuild_trend_buckets, rolled back."""
+    snapshot = lambda: (set(map(tuple, conn.execute('SELECT * FROM trend_buckets'))),
+                        set(map(tuple, conn.execute('SELECT * FROM trend_windows'))),
+                        conn.execute(f'SELECT {api.TREND_AS_OF}').fetchone()[0])
+    incremental = snapshot()
+    api.rebuild_trend_buckets(conn)
+    recount = snapshot()
+    conn.rollback()
+    problems = [f'{name}: {len(a ^ b)} rows differ from a recount'
+                for name, a, b in zip(('trend_buckets', 'trend_windows'), incremental, recount) if a != b]
+    if incremental[2] != recount[2]:
+        problems.append(f'trend_as_of {incremental[2]} != {recount[2]}')
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--ops', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    build_db(os.path.join(tempfile.mkdtemp(), 'check.db'), args.rows, args.seed)
+    conn = api.get_db()
+    problems = check_rollups(conn) + check_trends(conn)
+    mutate(conn, args.ops, args.seed)
+    problems += check_rollups(conn) + check_trends(conn)
+    conn.close()
+    for p in problems:
+        print(f'FAIL {p}')
+    print(f'{args.rows} rows + {args.ops} random writes: ' + ('OK' if not problems else f'{len(problems)} problem(s)'))
+    sys.exit(1 if problems else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Shared helpers for the benchmark scripts: synthetic datasets, ports, percentiles
+"""
+
+import os
+import random
+import socket
+import sys
+import time
+import urllib.request
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'cgi-bin'))
+import api
+
+SECTORS = ['Food & Beverage', 'Fintech', 'Healthcare', 'Real Estate', 'Retail',
+           'Education', 'Logistics', 'Tourism', 'Technology']
+PLATFORMS = ['Reddit', 'X / Twitter', 'LinkedIn', 'Facebook Groups', 'Forums', 'Google Reviews', 'News']
+TYPES = ['trending', 'pain_point', 'opportunity', 'mention']
+PRIORITIES = ['High', 'Medium', 'Low']
+VOCAB = sorted({w.strip(',.').lower() for s in api.SEED_SIGNALS for w in (s['title'] + ' ' + s['summary']).split()
+                if len(w) > 3})
+ARABIC_VOCAB = sorted({w for s in api.SEED_SIGNALS for w in s['arabic_title'].split() if len(w) > 2})
+KEYWORDS = sorted({k.strip() for s in api.SEED_SIGNALS for k in s['keywords'].split(',')})
+
+def _zipf_vocab(words, extra, seed):
+    # Real words first, then pseudo-words; Zipf weights keep hit rates realistic
+    rnd = random.Random(seed)
+    vocab = list(words) + [''.join(rnd.choices('abcdefghijklmnopqrstuvwxyz', k=rnd.randint(4, 9))) for _ in range(extra)]
+    rnd.shuffle(vocab)
+    cum, total = [], 0.0
+    for rank in range(1, len(vocab) + 1):
+        total += 1.0 / rank
+        cum.append(total)
+    return vocab, cum
+
+def synthetic_signals(n, seed=42, days=60):
+    rnd = random.Random(seed)
+    vocab, cum = _zipf_vocab(VOCAB, 20000, seed)
+    words = lambda k: ' '.join(rnd.choices(vocab, cum_weights=cum, k=k))
+    start = date(2026, 1, 1)
+    for _ in range(n):
+        yield (words(8).capitalize(),
+               ' '.join(rnd.choices(ARABIC_VOCAB, k=6)),
+               words(30),
+               rnd.choice(TYPES), rnd.choice(SECTORS), rnd.choice(PLATFORMS), rnd.choice(PRIORITIES),
+               rnd.randint(1, 100), rnd.randint(0, 200),
+               ','.join(rnd.sample(KEYWORDS, 4)),
+               words(60),
+               'https://example.com/' + str(rnd.getrandbits(48)),
+               (start + timedelta(days=rnd.randrange(days))).isoformat())
+
+def build_db(path, n, seed=42):
+    """Create a fresh database at `path` holding `n` synthetic signals."""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    api.DB_PATH = path
+    api.init_db()
+    conn = api.get_db()
+    conn.execute('DELETE FROM signals')
+    rows = synthetic_signals(n, seed)
+    while True:
+        chunk = [r for _, r in zip(range(50000), rows)]
+        if not chunk:
+            break
+        conn.executemany('''INSERT INTO signals
+            (title, arabic_title, summary, type, sector, platform, priority, score, mentions, keywords, raw_text, source_url, date_collected)
+            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)''', chunk)
+    conn.commit()
+    conn.close()
+    return path
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for(url, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'server at {url} did not come up')
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+def timed(fn, repeat=20):
+    """Run fn `repeat` times; return (latencies in ms, last result)."""
+    latencies, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies, result
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Mock OpenAI-compatible /v1/chat/completions server for exercising analyze.py offline.
+Returns one insight per input post, sleeps to imitate model latency and answers 429 with
+Retry-After once more than --rps requests arrive within a second.
+Usage: python bench/mock_completions.py [--port 9000] [--latency 0.8] [--rps 4]
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SECTORS = ['Food & Beverage', 'Fintech', 'Healthcare', 'Real Estate', 'Retail', 'Education', 'Logistics', 'Tourism']
+
+class MockState:
+    def __init__(self, latency, rps, per_post):
+        self.latency = latency
+        self.rps = rps
+        self.per_post = per_post
+        self.lock = threading.Lock()
+        self.window = []
+        self.stats = {"requests": 0, "throttled": 0, "posts": 0, "max_in_flight": 0}
+        self.in_flight = 0
+
+    def admit(self):
+        """Sliding one-second window; returns seconds to wait, or 0 when admitted."""
+        with self.lock:
+            now = time.monotonic()
+            self.window = [t for t in self.window if now - t < 1.0]
+            if self.rps and len(self.window) >= self.rps:
+                self.stats['throttled'] += 1
+                return 1.0 - (now - self.window[0])
+            self.window.append(now)
+            self.stats['requests'] += 1
+            self.in_flight += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.in_flight)
+            return 0
+
+    def done(self):
+        with self.lock:
+            self.in_flight -= 1
+
+def insight_for(post):
+    text = f"{post.get('title') or ''} {post.get('body') or ''}"
+    h = sum(map(ord, text))
+    return {"post_id": post.get('id'), "pain_point": (post.get('title') or '')[:80], "unmet_need": "",
+            "sector": SECTORS[h % len(SECTORS)], "sentiment": ['positive', 'negative', 'neutral'][h % 3],
+            "opportunity_signal": ['high', 'medium', 'low'][h % 3], "language": "English",
+            "summary": text[:160], "source_url": post.get('url') or ''}
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, payload, headers=()):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if not self.path.endswith('/chat/completions'):
+                return self._reply(404, {"error": {"message": "not found"}})
+            wait = state.admit()
+            if wait:
+                return self._reply(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                   [('Retry-After', f'{max(wait, 0.05):.2f}')])
+            try:
+                request = json.loads(raw)
+                user = request['messages'][-1]['content']
+                posts = json.loads(user[user.index('['):])
+                time.sleep(state.latency + state.per_post * len(posts))
+                with state.lock:
+                    state.stats['posts'] += len(posts)
+                content = json.dumps({"insights": [insight_for(p) for p in posts]}, ensure_ascii=False)
+                prompt_tokens = math.ceil(len(raw) / 4)
+                completion_tokens = math.ceil(len(content) / 4)
+                self._reply(200, {
+                    "id": "chatcmpl-mock", "object": "chat.completion", "model": request.get('model'),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                })
+            finally:
+                state.done()
+    return Handler
+
+def serve(port, latency=0.8, rps=4, per_post=0.02):
+    """Start the mock in a background thread; returns (server, state)."""
+    state = MockState(latency, rps, per_post)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock OpenAI-compatible chat completions endpoint')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency', type=float, default=0.8, help='base seconds per request')
+    parser.add_argument('--per-post', type=float, default=0.02, help='extra seconds per post in the batch')
+    parser.add_argument('--rps', type=int, default=4, help='requests per second before 429s (0 = unlimited)')
+    args = parser.parse_args()
+    server, _ = serve(args.port, args.latency, args.rps, args.per_post)
+    print(f'Mock completions on http://127.0.0.1:{args.port}/v1')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
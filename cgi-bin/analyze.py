@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+UAE Market Intelligence — Cached LLM analysis
+Prefilters collected posts, serves repeat content from a content-hash cache and sends the rest
+to an OpenAI-compatible completions API in token-budgeted batches with bounded, adaptive concurrency.
+Usage: python cgi-bin/analyze.py [--since-hours 24] [--concurrency 4] [--base-url http://127.0.0.1:9000/v1]
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import api
+import ingest
+
+# ===================== CONFIG =====================
+MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4o')
+BASE_URL = os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+BODY_CHARS = 500
+BATCH_TOKENS = 6000
+BATCH_POSTS = 40
+CONCURRENCY = 4
+MAX_RETRIES = 8
+MAX_BACKOFF = 60.0
+
+SYSTEM_PROMPT = (
+    "You are a UAE market intelligence analyst. Analyze social media posts, news articles, and forum discussions "
+    "from the UAE. For each post, extract structured insights. Return a JSON object with an 'insights' array. "
+    "Each insight object must have: post_id (the id of the input post), pain_point (string, the frustration or "
+    "problem expressed, or empty), unmet_need (string, what the person wishes existed, or empty), sector (one of: "
+    "Food & Beverage, Fintech, Healthcare, Real Estate, Retail, Education, Logistics, Tourism, Other), sentiment "
+    "(positive/negative/neutral), opportunity_signal (high/medium/low), language (Arabic/English based on original "
+    "content), summary (1-2 sentence summary of the key insight), source_url (from input). Focus on UAE-specific "
+    "market signals. Ignore generic complaints not related to business opportunities."
+)
+# Cached insights are only valid for the prompt and model that produced them
+PROMPT_VERSION = hashlib.sha1(f'{MODEL}\n{SYSTEM_PROMPT}'.encode('utf-8')).hexdigest()[:12]
+
+# ===================== PREFILTER =====================
+MIN_WORDS = 6
+RELEVANCE_TERMS = {ingest.normalize_text(t) for t in [
+    'uae', 'dubai', 'abu dhabi', 'sharjah', 'ajman', 'ras al khaimah', 'rak', 'fujairah', 'al ain', 'emirates', 'gcc',
+    'business', 'startup', 'company', 'market', 'customer', 'service', 'price', 'prices', 'cost', 'expensive', 'cheap',
+    'fees', 'rent', 'delivery', 'app', 'bank', 'payment', 'visa', 'school', 'hospital', 'clinic', 'restaurant',
+    'shop', 'store', 'need', 'looking for', 'recommend', 'problem', 'issue', 'complaint', 'waiting', 'support',
+    'الإمارات', 'دبي', 'أبوظبي', 'الشارقة', 'العين', 'شركة', 'سوق', 'خدمة', 'سعر', 'أسعار', 'غالي', 'توصيل',
+    'تطبيق', 'بنك', 'إيجار', 'مشكلة', 'شكوى', 'شكاوى', 'أحتاج', 'مطعم', 'مدرسة', 'مستشفى',
+]}
+
+def prefilter(post):
+    """Return why a post should not be sent to the model, or None to keep it."""
+    text = ingest.normalize_text(f"{post.get('title') or ''} {post.get('body') or ''}")
+    if len(text.split()) < MIN_WORDS:
+        return 'too_short'
+    padded = f' {text} '
+    if not any(f' {term} ' in padded for term in RELEVANCE_TERMS) and not post.get('subreddit'):
+        return 'off_topic'
+    return None
+
+def estimate_tokens(text):
+    # ~4 chars per token for English; Arabic tokenises denser, so count its letters twice
+    arabic = sum(1 for ch in text if '؀' <= ch <= 'ۿ')
+    return math.ceil((len(text) + arabic) / 4)
+
+# ===================== CACHE =====================
+def cache_get(conn, hashes):
+    found = {}
+    hashes = list(hashes)
+    for i in range(0, len(hashes), 900):
+        chunk = hashes[i:i + 900]
+        for h, insights in conn.execute(
+                f'''SELECT content_hash, insights FROM analysis_cache
+                    WHERE prompt_version = ? AND content_hash IN ({",".join("?" * len(chunk))})''',
+                [PROMPT_VERSION] + chunk):
+            found[h] = json.loads(insights)
+    if found:
+        conn.executemany('UPDATE analysis_cache SET hits = hits + 1 WHERE content_hash = ? AND prompt_version = ?',
+                         [(h, PROMPT_VERSION) for h in found])
+    return found
+
+def cache_put(conn, entries):
+    conn.executemany('''INSERT OR REPLACE INTO analysis_cache (content_hash, prompt_version, model, insights)
+        VALUES (?, ?, ?, ?)''', [(h, PROMPT_VERSION, MODEL, json.dumps(ins, ensure_ascii=False)) for h, ins in entries])
+
+# ===================== BATCHING =====================
+def post_payload(post, post_id):
+    return {"id": post_id, "source": post.get('source'), "title": post.get('title'),
+            "body": (post.get('body') or '')[:BODY_CHARS], "score": post.get('score'), "url": post.get('url')}
+
+def pack_batches(posts, token_budget=BATCH_TOKENS, max_posts=BATCH_POSTS):
+    """Greedy first-fit in input order: fill a batch until the next post would exceed the budget."""
+    batches, current, used = [], [], 0
+    for post in posts:
+        cost = estimate_tokens(json.dumps(post_payload(post, len(current)), ensure_ascii=False))
+        if current and (used + cost > token_budget or len(current) >= max_posts):
+            batches.append(current)
+            current, used = [], 0
+        current.append(post)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+# ===================== CLIENT =====================
+class RateLimited(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__('rate limited')
+        self.retry_after = retry_after
+
+class TransientError(Exception):
+    pass
+
+class CompletionClient:
+    def __init__(self, base_url=BASE_URL, api_key=None, model=MODEL, timeout=120):
+        self.url = base_url.rstrip('/') + '/chat/completions'
+        self.api_key = api_key if api_key is not None else os.environ.get('OPENAI_API_KEY', '')
+        self.model = model
+        self.timeout = timeout
+
+    def analyze(self, batch):
+        """Send one batch; returns (insights, usage)."""
+        posts = [post_payload(p, i) for i, p in enumerate(batch)]
+        body = json.dumps({
+            "model": self.model,
+            "temperature": 0.3,
+            "response_format": {"type": "json_object"},
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": "Analyze these posts from UAE platforms:\n\n" + json.dumps(posts, ensure_ascii=False)},
+            ],
+        }, ensure_ascii=False).encode('utf-8')
+        req = urllib.request.Request(self.url, data=body, method='POST', headers={
+            'Content-Type': 'application/json', 'Authorization': f'Bearer {self.api_key}'})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as res:
+                data = json.loads(res.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                raise RateLimited(retry_after_seconds(e.headers.get('Retry-After')))
+            if e.code >= 500:
+                raise TransientError(f'HTTP {e.code}')
+            raise
+        except (urllib.error.URLError, TimeoutError) as e:
+            raise TransientError(str(e))
+        content = json.loads(data['choices'][0]['message']['content'])
+        return content.get('insights') or [], data.get('usage') or {}
+
+def retry_after_seconds(value):
+    """Retry-After as seconds from now: delta-seconds or an HTTP-date. None when it is missing or
+    unparseable, so the limiter falls back to its exponential backoff."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return max(0.0, seconds) if math.isfinite(seconds) else None
+
+class AdaptiveLimiter:
+    """Bounds in-flight requests. A 429 halves the allowed concurrency and pauses every
+    worker for the Retry-After (or an exponential backoff); each run of successes as long as
+    the current limit earns one slot back (AIMD)."""
+
+    def __init__(self, max_concurrency):
+        self.max = max_concurrency
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self.successes = 0
+        self.backoff = 0.0
+        self.pause_until = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while True:
+                wait = self.pause_until - time.monotonic()
+                if wait > 0:
+                    self.cond.wait(wait)
+                elif self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return
+                else:
+                    self.cond.wait()
+
+    def release(self, throttled=False, retry_after=None):
+        with self.cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+                # Trust the server's Retry-After; otherwise back off exponentially
+                self.backoff = min(MAX_BACKOFF, self.backoff * 2 or 0.5)
+                delay = min(MAX_BACKOFF, retry_after) if retry_after is not None else self.backoff
+                self.pause_until = max(self.pause_until, time.monotonic() + delay + random.uniform(0, delay / 10))
+            else:
+                self.backoff = 0.0
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < self.max:
+                    self.limit += 1
+                    self.successes = 0
+            self.cond.notify_all()
+
+def _analyze_with_retries(client, limiter, batch):
+    throttles = 0
+    for _ in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            insights, usage = client.analyze(batch)
+        except RateLimited as e:
+            limiter.release(throttled=True, retry_after=e.retry_after)
+            throttles += 1
+            continue
+        except TransientError:
+            limiter.release(throttled=True)
+            throttles += 1
+            continue
+        except BaseException:
+            limiter.release()
+            raise
+        limiter.release()
+        return insights, usage, throttles
+    raise TransientError(f'gave up after {MAX_RETRIES + 1} attempts')
+
+# ===================== PIPELINE =====================
+def recent_posts(conn, since_hours=24):
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=since_hours)).strftime('%Y-%m-%dT%H:%M:%S')
+    rows = conn.execute('''SELECT id, content_hash, source, subreddit, title, body, score, comments, url, collected_at
+        FROM raw_posts WHERE collected_at >= ? ORDER BY id''', (cutoff,)).fetchall()
+    return [dict(r) for r in rows]
+
+def _post_id(insight):
+    """The batch index an insight refers to; models often echo it back as a string."""
+    if not isinstance(insight, dict):
+        return None
+    try:
+        return int(str(insight.get('post_id')).strip())
+    except ValueError:
+        return None
+
+def run_analysis(conn, posts, client=None, concurrency=CONCURRENCY, token_budget=BATCH_TOKENS, max_posts=BATCH_POSTS):
+    """Analyse posts, reusing cached insights; returns {"insights": [...], "metrics": {...}}."""
+    t0 = time.perf_counter()
+    client = client or CompletionClient()
+    metrics = {"posts": len(posts), "filtered": {}, "cache_hits": 0, "duplicates": 0, "analyzed": 0,
+               "batches": 0, "failed_batches": 0, "throttled": 0, "tokens_used": 0,
+               "tokens_saved_cache": 0, "tokens_saved_filter": 0, "unmatched_insights": 0}
+
+    kept = []
+    for post in posts:
+        post.setdefault('content_hash', ingest.content_hash(post.get('title'), post.get('body')))
+        reason = prefilter(post)
+        if reason:
+            metrics['filtered'][reason] = metrics['filtered'].get(reason, 0) + 1
+            metrics['tokens_saved_filter'] += estimate_tokens(json.dumps(post_payload(post, 0), ensure_ascii=False))
+        else:
+            kept.append(post)
+
+    cached = cache_get(conn, {p['content_hash'] for p in kept})
+    todo, queued = [], set()
+    for post in kept:
+        h = post['content_hash']
+        if h in cached or h in queued:
+            metrics['cache_hits' if h in cached else 'duplicates'] += 1
+            metrics['tokens_saved_cache'] += estimate_tokens(json.dumps(post_payload(post, 0), ensure_ascii=False))
+        else:
+            queued.add(h)
+            todo.append(post)
+
+    batches = pack_batches(todo, token_budget, max_posts)
+    metrics['batches'] = len(batches)
+    limiter = AdaptiveLimiter(concurrency)
+    with ThreadPoolExecutor(concurrency) as pool:
+        futures = {pool.submit(_analyze_with_retries, client, limiter, b): b for b in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                insights, usage, throttles = future.result()
+            except Exception:
+                metrics['failed_batches'] += 1
+                continue
+            metrics['throttled'] += throttles
+            metrics['analyzed'] += len(batch)
+            metrics['tokens_used'] += usage.get('total_tokens', 0)
+            by_post, unmatched = {i: [] for i in range(len(batch))}, 0
+            for insight in insights:
+                post_id = _post_id(insight)
+                if post_id in by_post:
+                    insight.pop('post_id')
+                    by_post[post_id].append(insight)
+                else:
+                    unmatched += 1
+            entries = [(batch[i]['content_hash'], found) for i, found in by_post.items()]
+            cached.update(entries)
+            if unmatched:
+                # Can't tell which post an orphan insight belongs to, so nothing in this batch is
+                # trusted as final; the next run asks again
+                metrics['unmatched_insights'] += unmatched
+                continue
+            # Posts the model skipped cache as [] so they are not paid for again
+            cache_put(conn, entries)
+    conn.commit()
+
+    insights = []
+    for post in kept:
+        for insight in cached.get(post['content_hash'], []):
+            # The same text re-posted elsewhere keeps its own URL
+            insights.append(dict(insight, source_url=post.get('url') or insight.get('source_url'),
+                                 content_hash=post['content_hash']))
+    lookups = metrics['cache_hits'] + metrics['duplicates'] + len(todo)
+    metrics['hit_rate'] = round((metrics['cache_hits'] + metrics['duplicates']) / lookups, 4) if lookups else 0.0
+    metrics['wall_seconds'] = round(time.perf_counter() - t0, 3)
+    return {"insights": insights, "metrics": metrics}
+
+# ===================== CLI =====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyse recent posts with a content-hash result cache')
+    parser.add_argument('--db', default=None, help='SQLite path (defaults to api.DB_PATH)')
+    parser.add_argument('--since-hours', type=float, default=24)
+    parser.add_argument('--base-url', default=BASE_URL, help='OpenAI-compatible API base URL')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--batch-tokens', type=int, default=BATCH_TOKENS)
+    parser.add_argument('--batch-posts', type=int, default=BATCH_POSTS)
+    args = parser.parse_args(argv)
+
+    if args.db:
+        api.DB_PATH = args.db
+    api.init_db()
+    conn = api.get_db()
+    result = run_analysis(conn, recent_posts(conn, args.since_hours), CompletionClient(args.base_url),
+                          args.concurrency, args.batch_tokens, args.batch_posts)
+    conn.close()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
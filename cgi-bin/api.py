@@ -5,19 +5,29 @@ Serves signal data from SQLite database via CGI
 Endpoint: /cgi-bin/api.py?action=...
 """
 
+import base64
 import cgi
 import cgitb
+import functools
+import gzip
+import hmac
+import html
 import json
+import math
 import sqlite3
 import os
+import re
 import sys
-from datetime import datetime, timedelta
+import time
+import unicodedata
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qs
 import random
 
-cgitb.enable()
+import instrument
 
 # ===================== DB SETUP =====================
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'market_intel.db')
+DB_PATH = os.environ.get('MARKET_INTEL_DB') or os.path.join(os.path.dirname(__file__), '..', 'data', 'market_intel.db')
 
 def get_db():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
@@ -25,8 +35,13 @@ def get_db():
     conn.row_factory = sqlite3.Row
     return conn
 
+def add_column(conn, table, column, decl):
+    if column not in [r[1] for r in conn.execute(f'PRAGMA table_info({table})')]:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+
 def init_db():
     conn = get_db()
+    conn.execute('PRAGMA journal_mode = WAL')
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS signals (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -61,6 +76,73 @@ def init_db():
         value TEXT,
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS raw_posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        dedupe_key TEXT NOT NULL UNIQUE,
+        content_hash TEXT NOT NULL,
+        source TEXT,
+        subreddit TEXT,
+        title TEXT,
+        body TEXT,
+        author TEXT,
+        score INTEGER DEFAULT 0,
+        comments INTEGER DEFAULT 0,
+        mentions INTEGER DEFAULT 1,
+        url TEXT,
+        language TEXT,
+        collected_at TEXT,
+        first_seen TEXT
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_raw_posts_content_hash ON raw_posts(content_hash)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_raw_posts_collected_at ON raw_posts(collected_at)')
+    c.execute('''CREATE TABLE IF NOT EXISTS clusters (
+        id INTEGER PRIMARY KEY,
+        label TEXT,
+        size INTEGER DEFAULT 0,
+        mentions INTEGER DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS cluster_items (
+        item_type TEXT NOT NULL CHECK(item_type IN ('post','signal')),
+        item_id INTEGER NOT NULL,
+        cluster_id INTEGER NOT NULL,
+        signature BLOB NOT NULL,
+        PRIMARY KEY (item_type, item_id)
+    ) WITHOUT ROWID''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_cluster_items_cluster ON cluster_items(cluster_id)')
+    c.execute('''CREATE TABLE IF NOT EXISTS cluster_buckets (
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        item_type TEXT NOT NULL,
+        item_id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, item_type, item_id)
+    ) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS analysis_cache (
+        content_hash TEXT NOT NULL,
+        prompt_version TEXT NOT NULL,
+        model TEXT,
+        insights TEXT NOT NULL,
+        hits INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (content_hash, prompt_version)
+    ) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS api_metrics (
+        kind TEXT NOT NULL,
+        name TEXT NOT NULL,
+        labels TEXT NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (kind, name, labels)
+    ) WITHOUT ROWID''')
+    add_column(conn, 'signals', 'cluster_id', 'INTEGER')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_signals_score ON signals(score DESC)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_signals_sector_score ON signals(sector, score DESC)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_signals_platform_score ON signals(platform, score DESC)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_signals_priority ON signals(priority)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_signals_type ON signals(type)')
+    init_search_index(conn)
+    init_stats_rollup(conn)
+    init_change_log(conn)
+    init_trend_windows(conn)
     conn.commit()
     # Seed if empty
     cursor = conn.execute('SELECT COUNT(*) FROM signals')
@@ -68,6 +150,287 @@ def init_db():
         seed_data(conn)
     conn.close()
 
+# ===================== SEARCH INDEX =====================
+# FTS5 tokenizers cannot be registered from Python's sqlite3, so Arabic
+# normalisation happens before text reaches the unicode61 tokenizer: the sync
+# triggers fold each column in SQL, and queries are folded with the same table.
+# The index is contentless (it keeps no copy of the folded text), so snippets
+# are cut from the original columns in Python using the same folding.
+ARABIC_FOLDS = {
+    '\u0623': '\u0627', '\u0625': '\u0627', '\u0622': '\u0627', '\u0671': '\u0627',  # alef variants -> alef
+    '\u0649': '\u064a', '\u0626': '\u064a',  # alef maqsura, yeh with hamza -> yeh
+    '\u0624': '\u0648',  # waw with hamza -> waw
+    '\u0629': '\u0647',  # taa marbuta -> heh
+    '\u0640': '',  # tatweel
+}
+ARABIC_FOLDS.update({chr(cp): '' for cp in list(range(0x064B, 0x0653)) + [0x0670]})  # harakat, dagger alef
+_ARABIC_TRANSLATION = str.maketrans(ARABIC_FOLDS)
+
+FTS_COLUMNS = ['title', 'arabic_title', 'summary', 'keywords', 'raw_text']
+FTS_WEIGHTS = (10.0, 10.0, 4.0, 6.0, 1.0)
+SEARCH_MODES = ('fts', 'like')
+SNIPPET_TOKENS = 12
+# Letters and digits, keeping Arabic harakat, dagger alef and tatweel inside the word
+_TOKEN_RE = re.compile(r'(?:[^\W_]|[\u064B-\u0652\u0670\u0640])+')
+
+def fold_arabic(text):
+    return text.translate(_ARABIC_TRANSLATION) if text else text
+
+def _fold_sql(expr):
+    for src, dst in ARABIC_FOLDS.items():
+        expr = f"replace({expr}, '{src}', '{dst}')"
+    return expr
+
+def init_search_index(conn):
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name='signals_fts'").fetchone()
+    if row and "content=''" not in row[0]:
+        # Indexes built before the contentless layout stored a folded copy of every column
+        for name in ('signals_fts_ai', 'signals_fts_ad', 'signals_fts_au'):
+            conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        conn.execute('DROP TABLE signals_fts')
+        row = None
+    conn.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS signals_fts USING fts5(
+        {', '.join(FTS_COLUMNS)}, content='', tokenize = 'unicode61 remove_diacritics 2'
+    )''')
+    cols = ', '.join(FTS_COLUMNS)
+    new_vals = ', '.join(_fold_sql(f'new.{c}') for c in FTS_COLUMNS)
+    # Contentless rows are removed with the 'delete' command and the exact values that were indexed
+    delete_old = f'''INSERT INTO signals_fts (signals_fts, rowid, {cols})
+        VALUES ('delete', old.id, {', '.join(_fold_sql(f'old.{c}') for c in FTS_COLUMNS)});'''
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS signals_fts_ai AFTER INSERT ON signals BEGIN
+        INSERT INTO signals_fts (rowid, {cols}) VALUES (new.id, {new_vals});
+    END''')
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS signals_fts_ad AFTER DELETE ON signals BEGIN {delete_old} END')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS signals_fts_au AFTER UPDATE OF {cols} ON signals BEGIN
+        {delete_old}
+        INSERT INTO signals_fts (rowid, {cols}) VALUES (new.id, {new_vals});
+    END''')
+    if not row:
+        # Backfill rows written before the index existed
+        conn.execute(f'''INSERT INTO signals_fts (rowid, {cols})
+            SELECT id, {', '.join(_fold_sql(c) for c in FTS_COLUMNS)} FROM signals''')
+
+def query_terms(query):
+    """Search terms of free text, Arabic-folded first so harakat never split a word."""
+    return re.findall(r'\w+', fold_arabic(query or ''))
+
+def fts_query(query):
+    """Turn free text into an FTS5 MATCH expression: every term, prefix-matched."""
+    return ' '.join(f'"{t}"*' for t in query_terms(query))
+
+@functools.lru_cache(maxsize=1)
+def _combining_marks():
+    # Combining blocks up to U+20FF plus U+FE20-FE2F; built on first use to keep CGI startup cheap
+    cps = list(range(0x0300, 0x2100)) + list(range(0xFE20, 0xFE30))
+    return {cp: None for cp in cps if unicodedata.combining(chr(cp))}
+
+def _fold_text(text):
+    # Arabic folds, then what unicode61 remove_diacritics does: lower case, no combining marks
+    if text.isascii():
+        return text.lower()
+    return unicodedata.normalize('NFD', fold_arabic(text).lower()).translate(_combining_marks())
+
+_fold_token = functools.lru_cache(maxsize=65536)(_fold_text)
+
+def make_snippet(texts, query, size=SNIPPET_TOKENS):
+    """Up to `size` tokens from the first text (in FTS_COLUMNS order) with a prefix match for
+    `query`, matches wrapped in <mark>. Cut from the original text, so Arabic keeps its
+    spelling; HTML-escaped."""
+    terms = tuple(_fold_token(t) for t in query_terms(query))
+    for text in texts:
+        if not text or not any(t in _fold_text(text) for t in terms):
+            continue
+        tokens = [(m.start(), m.end()) for m in _TOKEN_RE.finditer(text)]
+        hits = [i for i, (start, end) in enumerate(tokens) if _fold_token(text[start:end]).startswith(terms)]
+        if hits:
+            break
+    else:
+        return ''
+    first = max(0, min(hits[0] - 2, len(tokens) - size))
+    window, marked = tokens[first:first + size], set(hits)
+    out, pos = [], window[0][0]
+    for i, (start, end) in enumerate(window, first):
+        if i in marked:
+            out += [html.escape(text[pos:start]), '<mark>', html.escape(text[start:end]), '</mark>']
+            pos = end
+    out.append(html.escape(text[pos:window[-1][1]]))
+    return ('…' if first else '') + ''.join(out) + ('…' if first + size < len(tokens) else '')
+
+# ===================== STATS ROLLUP =====================
+# signal_totals holds one count per sector x platform x type x priority (a few
+# hundred rows) for stats; signal_rollup adds the collection day for timeseries.
+# Both are maintained by triggers so neither action rescans signals. NULLs are
+# stored as '' because NULL keys never collide in a primary key and would
+# defeat the upsert.
+ROLLUP_DIMENSIONS = ['sector', 'platform', 'type', 'priority']
+ROLLUP_TABLES = {"signal_totals": [], "signal_rollup": ['day']}
+
+def _rollup_keys(prefix, extra):
+    return ([f"coalesce(substr({prefix}date_collected, 1, 10), '')"] if 'day' in extra else []) + \
+           [f"coalesce({prefix}{d}, '')" for d in ROLLUP_DIMENSIONS]
+
+def init_stats_rollup(conn):
+    for table, extra in ROLLUP_TABLES.items():
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name=?", (table,)).fetchone()
+        keys = extra + ROLLUP_DIMENSIONS
+        cols = ', '.join(keys)
+        conn.execute(f'''CREATE TABLE IF NOT EXISTS {table} (
+            {', '.join(f'{k} TEXT NOT NULL' for k in keys)},
+            signals INTEGER NOT NULL,
+            PRIMARY KEY ({cols})
+        ) WITHOUT ROWID''')
+        add = f'''INSERT INTO {table} ({cols}, signals) VALUES ({', '.join(_rollup_keys('new.', extra))}, 1)
+            ON CONFLICT ({cols}) DO UPDATE SET signals = signals + 1;'''
+        match_old = ' AND '.join(f'{c} = {k}' for c, k in zip(keys, _rollup_keys('old.', extra)))
+        remove = f'''UPDATE {table} SET signals = signals - 1 WHERE {match_old};
+            DELETE FROM {table} WHERE {match_old} AND signals <= 0;'''
+        watched = ', '.join((['date_collected'] if extra else []) + ROLLUP_DIMENSIONS)
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON signals BEGIN {add} END')
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON signals BEGIN {remove} END')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_au
+            AFTER UPDATE OF {watched} ON signals BEGIN {remove} {add} END''')
+        if not exists:
+            conn.execute(f'''INSERT INTO {table} ({cols}, signals)
+                SELECT {', '.join(_rollup_keys('', extra))}, COUNT(*) FROM signals
+                GROUP BY {', '.join(str(i + 1) for i in range(len(keys)))}''')
+
+# ===================== TREND WINDOWS =====================
+# trend_buckets holds daily per-keyword and per-sector counts. trend_windows
+# holds each term's 1d/7d/28d totals relative to the newest collection day
+# (metadata 'trend_as_of'). Triggers add or remove each signal in both
+# tables. When a newer day arrives, or the newest day loses its last signal,
+# the windows are rebuilt from the last 28 days of buckets only, so a trending
+# query never touches the full history. Days after tomorrow (UTC) are bucketed
+# but never become the window's end, so one bad date can't empty trending.
+TREND_AS_OF = "(SELECT value FROM metadata WHERE key = 'trend_as_of')"
+TREND_MAX_DAY = "date('now', '+1 day')"
+TREND_DIMENSIONS = ['keyword', 'sector']
+TREND_TRIGGERS = ['trend_roll_bi', 'trend_roll_bu', 'trend_ai', 'trend_ad', 'trend_au']
+TREND_TRIGGERS_VERSION = '2'
+
+def _trend_day(prefix):
+    return f"coalesce(date(substr({prefix}date_collected, 1, 10)), '')"
+
+def _keyword_array(prefix):
+    # Keywords are stored comma-separated; quote them into a JSON array so json_each can split them
+    kw = f"replace(replace(coalesce({prefix}keywords, ''), '\\', '\\\\'), '\"', '\\\"')"
+    for ch in (9, 10, 13):
+        kw = f"replace({kw}, char({ch}), ' ')"
+    return f"""'["' || replace({kw}, ',', '","') || '"]'"""
+
+def _trend_terms(prefix):
+    day = _trend_day(prefix)
+    return f'''SELECT DISTINCT 'keyword' AS dim, lower(trim(value)) AS term FROM json_each({_keyword_array(prefix)})
+            WHERE trim(value) <> '' AND {day} <> ''
+        UNION SELECT 'sector', {prefix}sector WHERE coalesce({prefix}sector, '') <> '' AND {day} <> '' '''
+
+def _trend_window_sums(day):
+    return (f"SUM(signals * (day = {day})), SUM(signals * (day > date({day}, '-7 days'))), SUM(signals), "
+            f"SUM(mentions * (day > date({day}, '-7 days')))")
+
+def _trend_in_window(day):
+    return f"{day} > date({TREND_AS_OF}, '-28 days') AND {day} <= {TREND_AS_OF}"
+
+def _trend_reset(guard, as_of):
+    """Statements that rebuild the windows ending at `as_of` when `guard` holds; the metadata
+    update comes last because it changes what the guard sees."""
+    return f'''DELETE FROM trend_windows WHERE {guard};
+        INSERT INTO trend_windows (dim, term, d1, d7, d28, m7)
+            SELECT dim, term, {_trend_window_sums(as_of)} FROM trend_buckets
+            WHERE {guard} AND day > date({as_of}, '-28 days') AND day <= {as_of} GROUP BY dim, term;
+        INSERT OR REPLACE INTO metadata (key, value, updated_at)
+            SELECT 'trend_as_of', {as_of}, CURRENT_TIMESTAMP WHERE {guard};'''
+
+def init_trend_windows(conn):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name='trend_buckets'").fetchone()
+    conn.execute('''CREATE TABLE IF NOT EXISTS trend_buckets (
+        dim TEXT NOT NULL,
+        term TEXT NOT NULL,
+        day TEXT NOT NULL,
+        signals INTEGER NOT NULL,
+        mentions INTEGER NOT NULL,
+        PRIMARY KEY (dim, term, day)
+    ) WITHOUT ROWID''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_trend_buckets_day ON trend_buckets(day)')
+    conn.execute('''CREATE TABLE IF NOT EXISTS trend_windows (
+        dim TEXT NOT NULL,
+        term TEXT NOT NULL,
+        d1 INTEGER NOT NULL,
+        d7 INTEGER NOT NULL,
+        d28 INTEGER NOT NULL,
+        m7 INTEGER NOT NULL,
+        PRIMARY KEY (dim, term)
+    ) WITHOUT ROWID''')
+    day, new_terms = _trend_day('new.'), _trend_terms('new.')
+    old_day, old_terms = _trend_day('old.'), _trend_terms('old.')
+    week_ago = f"date({TREND_AS_OF}, '-7 days')"
+    newer = f"{day} > coalesce({TREND_AS_OF}, '') AND {day} <= {TREND_MAX_DAY}"
+    # Runs before the row is added, so the add step lands it in the new windows
+    roll = _trend_reset(newer, day)
+    # The newest day lost its last signal: fall back to the latest day still bucketed
+    latest = f"(SELECT MAX(day) FROM trend_buckets WHERE day <= {TREND_MAX_DAY})"
+    emptied = f"{old_day} = {TREND_AS_OF} AND NOT EXISTS (SELECT 1 FROM trend_buckets WHERE day = {old_day})"
+    unroll = _trend_reset(emptied, latest)
+    add = f'''INSERT INTO trend_buckets (dim, term, day, signals, mentions)
+            SELECT dim, term, {day}, 1, coalesce(new.mentions, 0) FROM ({new_terms}) WHERE true
+            ON CONFLICT (dim, term, day) DO UPDATE SET signals = signals + 1, mentions = mentions + excluded.mentions;
+        INSERT INTO trend_windows (dim, term, d1, d7, d28, m7)
+            SELECT dim, term, {day} = {TREND_AS_OF}, {day} > {week_ago}, 1,
+                   coalesce(new.mentions, 0) * ({day} > {week_ago})
+            FROM ({new_terms}) WHERE {_trend_in_window(day)}
+            ON CONFLICT (dim, term) DO UPDATE SET d1 = d1 + excluded.d1, d7 = d7 + excluded.d7,
+                d28 = d28 + 1, m7 = m7 + excluded.m7;'''
+    remove = f'''UPDATE trend_buckets SET signals = signals - 1, mentions = mentions - coalesce(old.mentions, 0)
+            WHERE day = {old_day} AND (dim, term) IN ({old_terms});
+        DELETE FROM trend_buckets WHERE day = {old_day} AND (dim, term) IN ({old_terms}) AND signals <= 0;
+        UPDATE trend_windows SET d1 = d1 - ({old_day} = {TREND_AS_OF}), d7 = d7 - ({old_day} > {week_ago}),
+                d28 = d28 - 1, m7 = m7 - coalesce(old.mentions, 0) * ({old_day} > {week_ago})
+            WHERE {_trend_in_window(old_day)} AND (dim, term) IN ({old_terms});
+        DELETE FROM trend_windows WHERE (dim, term) IN ({old_terms}) AND d28 <= 0;'''
+    # Trigger bodies changed in version 2; CREATE IF NOT EXISTS alone would keep the old ones
+    version = conn.execute("SELECT value FROM metadata WHERE key = 'trend_triggers'").fetchone()
+    outdated = (version[0] if version else None) != TREND_TRIGGERS_VERSION
+    if exists and outdated:
+        for name in TREND_TRIGGERS:
+            conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        rebuild_trend_windows(conn)
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS trend_roll_bi BEFORE INSERT ON signals WHEN {newer} BEGIN {roll} END')
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS trend_ai AFTER INSERT ON signals BEGIN {add} END')
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS trend_ad AFTER DELETE ON signals BEGIN {remove} {unroll} END')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trend_au AFTER UPDATE OF date_collected, sector, keywords, mentions
+        ON signals BEGIN {remove} {unroll} {roll} {add} END''')
+    if outdated:
+        conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('trend_triggers', ?)", (TREND_TRIGGERS_VERSION,))
+    if not exists:
+        # Backfill rows written before the tables existed
+        rebuild_trend_buckets(conn)
+
+def rebuild_trend_buckets(conn):
+    """Recount every bucket from signals, then the windows; the triggers make this unnecessary
+    in normal operation."""
+    day = _trend_day('s.')
+    conn.execute('DELETE FROM trend_buckets')
+    conn.execute(f'''INSERT INTO trend_buckets (dim, term, day, signals, mentions)
+        SELECT 'keyword', term, day, COUNT(*), SUM(m) FROM (
+            SELECT DISTINCT s.id, lower(trim(k.value)) AS term, {day} AS day, coalesce(s.mentions, 0) AS m
+            FROM signals s, json_each({_keyword_array('s.')}) k WHERE trim(k.value) <> '' AND {day} <> '')
+        GROUP BY term, day''')
+    conn.execute(f'''INSERT INTO trend_buckets (dim, term, day, signals, mentions)
+        SELECT 'sector', sector, {day}, COUNT(*), SUM(coalesce(mentions, 0)) FROM signals s
+        WHERE coalesce(sector, '') <> '' AND {day} <> '' GROUP BY 2, 3''')
+    rebuild_trend_windows(conn)
+
+def rebuild_trend_windows(conn):
+    as_of = conn.execute(f'SELECT MAX(day) FROM trend_buckets WHERE day <= {TREND_MAX_DAY}').fetchone()[0]
+    conn.execute('DELETE FROM trend_windows')
+    conn.execute("DELETE FROM metadata WHERE key = 'trend_as_of'")
+    if as_of:
+        conn.execute(f'''INSERT INTO trend_windows (dim, term, d1, d7, d28, m7)
+            SELECT dim, term, {_trend_window_sums('?1')} FROM trend_buckets
+            WHERE day > date(?1, '-28 days') AND day <= ?1 GROUP BY dim, term''', (as_of,))
+        conn.execute("INSERT OR REPLACE INTO metadata (key, value, updated_at) VALUES ('trend_as_of', ?, CURRENT_TIMESTAMP)",
+                     (as_of,))
+
 # ===================== SEED DATA =====================
 SEED_SIGNALS = [
   {"title":"Surge in demand for halal certified delivery platforms","arabic_title":"\u0632\u064a\u0627\u062f\u0629 \u0627\u0644\u0637\u0644\u0628 \u0639\u0644\u0649 \u0645\u0646\u0635\u0627\u062a \u0627\u0644\u062a\u0648\u0635\u064a\u0644 \u0627\u0644\u062d\u0644\u0627\u0644","summary":"Multiple users across UAE subreddits and Facebook Groups report difficulty finding reliable halal-certified food delivery options beyond major apps. Small restaurant owners highlight gaps in last-mile logistics for halal-only kitchens.","type":"trending","sector":"Food & Beverage","platform":"Reddit","priority":"High","score":91,"mentions":87,"keywords":"halal delivery,food logistics,UAE dining,last-mile","date_collected":"2026-02-20","source_url":"https://reddit.com/r/dubai","raw_text":"Honestly the halal delivery scene in Dubai is still super fragmented."},
@@ -115,98 +478,464 @@ def seed_data(conn):
     conn.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('last_seeded', ?)",(datetime.now().isoformat(),))
     conn.commit()
 
+# ===================== PAGINATION =====================
+SIGNAL_FIELDS = ['id', 'title', 'arabic_title', 'summary', 'type', 'sector', 'platform', 'priority', 'score',
+                 'mentions', 'keywords', 'raw_text', 'source_url', 'date_collected', 'created_at', 'cluster_id']
+HEAVY_FIELDS = {'raw_text'}
+DEFAULT_FIELDS = [f for f in SIGNAL_FIELDS if f not in HEAVY_FIELDS]
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+GZIP_MIN_BYTES = 1024
+
+def parse_fields(value):
+    """Columns to return; id and score are always included since they form the cursor."""
+    if not value:
+        return DEFAULT_FIELDS
+    if value in ('all', '*'):
+        return SIGNAL_FIELDS
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in SIGNAL_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return ['id', 'score'] + [f for f in fields if f not in ('id', 'score')]
+
+def parse_limit(value):
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def encode_cursor(key, last_id):
+    raw = json.dumps([key, last_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        key, last_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(last_id, int) or not (key is None or isinstance(key, (int, float))):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    return key, last_id
+
+def row_to_signal(row):
+    d = dict(row)
+    if 'keywords' in d:
+        d['keywords'] = [k.strip() for k in d['keywords'].split(',') if k.strip()] if d['keywords'] else []
+    return d
+
+def _score_page(conn, filters, args, fields, cursor, limit):
+    # Keyset on (score DESC, id ASC). The score <= ? bound lets SQLite seek the
+    # (..., score DESC) index instead of walking every earlier page; rows with
+    # a NULL score sort last and are paged by id alone.
+    cols = ', '.join(fields)
+    score, last_id = decode_cursor(cursor) if cursor else (None, None)
+    rows = []
+    if cursor is None or score is not None:
+        conds, params = filters + ['score IS NOT NULL'], list(args)
+        if cursor:
+            conds.append('score <= ? AND (score < ? OR id > ?)')
+            params += [score, score, last_id]
+        rows = instrument.fetch_all(conn, f'''SELECT {cols} FROM signals WHERE {' AND '.join(conds)}
+            ORDER BY score DESC, id ASC LIMIT ?''', params + [limit + 1])
+    if len(rows) <= limit:
+        conds, params = filters + ['score IS NULL'], list(args)
+        if cursor and score is None:
+            conds.append('id > ?')
+            params.append(last_id)
+        rows += instrument.fetch_all(conn, f'''SELECT {cols} FROM signals WHERE {' AND '.join(conds)}
+            ORDER BY id ASC LIMIT ?''', params + [limit + 1 - len(rows)])
+    next_cursor = encode_cursor(rows[limit - 1]['score'], rows[limit - 1]['id']) if len(rows) > limit else None
+    with instrument.phase('convert'):
+        return [row_to_signal(r) for r in rows[:limit]], next_cursor
+
+# ===================== CHANGE LOG =====================
+# One row per signal holding the version of its last insert/update/delete.
+# Versions come from a single monotonic counter (MAX(version) + 1), so the
+# newest version is also the data version used for ETags and ?since= deltas.
+DELTA_LIMIT = 1000
+
+def init_change_log(conn):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name='signal_changes'").fetchone()
+    conn.execute('''CREATE TABLE IF NOT EXISTS signal_changes (
+        signal_id INTEGER PRIMARY KEY,
+        created INTEGER NOT NULL,
+        version INTEGER NOT NULL,
+        deleted INTEGER NOT NULL DEFAULT 0
+    )''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_signal_changes_version ON signal_changes(version)')
+    next_version = '(SELECT coalesce(MAX(version), 0) + 1 FROM signal_changes)'
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS signal_changes_ai AFTER INSERT ON signals BEGIN
+        INSERT INTO signal_changes (signal_id, created, version) VALUES (new.id, {next_version}, {next_version})
+            ON CONFLICT (signal_id) DO UPDATE SET created = excluded.created, version = excluded.version, deleted = 0;
+    END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS signal_changes_ad AFTER DELETE ON signals BEGIN
+        UPDATE signal_changes SET version = {next_version}, deleted = 1 WHERE signal_id = old.id;
+    END''')
+    # Rewrites that leave the row unchanged (e.g. cluster refreshes) do not bump the version
+    cols = [f for f in SIGNAL_FIELDS if f != 'id']
+    changed = f"({', '.join('new.' + c for c in cols)}) IS NOT ({', '.join('old.' + c for c in cols)})"
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS signal_changes_au AFTER UPDATE ON signals WHEN {changed} BEGIN
+        INSERT INTO signal_changes (signal_id, created, version) VALUES (new.id, {next_version}, {next_version})
+            ON CONFLICT (signal_id) DO UPDATE SET version = excluded.version, deleted = 0;
+    END''')
+    if not exists:
+        conn.execute('INSERT INTO signal_changes (signal_id, created, version) SELECT id, 1, 1 FROM signals')
+
+def get_version(conn):
+    return conn.execute('SELECT coalesce(MAX(version), 0) FROM signal_changes').fetchone()[0]
+
+def get_changes(conn, since, fields=DEFAULT_FIELDS):
+    """Signals inserted, updated or deleted after version `since`. Asks the client to
+    reload (reset) when the delta is larger than a page or `since` is from another database."""
+    version = get_version(conn)
+    if since > version:
+        return {"version": version, "since": since, "reset": True}
+    changes = instrument.fetch_all(conn, '''SELECT signal_id, created, deleted FROM signal_changes
+        WHERE version > ? ORDER BY version LIMIT ?''', (since, DELTA_LIMIT + 1))
+    if len(changes) > DELTA_LIMIT:
+        return {"version": version, "since": since, "reset": True}
+    live = [r['signal_id'] for r in changes if not r['deleted']]
+    rows = {}
+    for i in range(0, len(live), 900):
+        chunk = live[i:i + 900]
+        fetched = instrument.fetch_all(
+            conn, f'SELECT {", ".join(fields)} FROM signals WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+        with instrument.phase('convert'):
+            rows.update((row['id'], row_to_signal(row)) for row in fetched)
+    created = {r['signal_id'] for r in changes if r['created'] > since}
+    return {"version": version, "since": since,
+            "inserted": [rows[i] for i in live if i in rows and i in created],
+            "updated": [rows[i] for i in live if i in rows and i not in created],
+            "deleted": [r['signal_id'] for r in changes if r['deleted'] and r['created'] <= since]}
+
+def etag_for(conn, action, params):
+    """Weak validator for read actions: the data version, plus the day when the
+    response is relative to today (timeseries without ?until=)."""
+    tag = str(get_version(conn))
+    if action == 'timeseries' and not params.get('until'):
+        tag += f'-{date.today().isoformat()}'
+    return f'W/"{tag}"'
+
+def etag_matches(etag, if_none_match):
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]
+
+def accepts_gzip(accept_encoding):
+    """Whether Accept-Encoding gives gzip (or, failing that, *) a q-value above 0."""
+    weights = {}
+    for item in (accept_encoding or '').lower().split(','):
+        coding, _, params = item.partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.strip()] = q
+    q = next((weights[c] for c in ('gzip', 'x-gzip', '*') if c in weights), 0.0)
+    return q > 0
+
+def encode_response(result, accept_encoding='', pretty=False):
+    """Compact JSON (indented with ?pretty=1), gzipped when the client accepts it and it pays off.
+    Returns the body and its Content-Type/Content-Encoding headers."""
+    if pretty:
+        body = json.dumps(result, ensure_ascii=False, indent=2)
+    else:
+        body = json.dumps(result, ensure_ascii=False, separators=(',', ':'))
+    payload = body.encode('utf-8')
+    headers = [('Content-Type', 'application/json; charset=utf-8'), ('Vary', 'Accept-Encoding')]
+    if len(payload) >= GZIP_MIN_BYTES and accepts_gzip(accept_encoding):
+        payload = gzip.compress(payload, compresslevel=6)
+        headers.append(('Content-Encoding', 'gzip'))
+    return payload, headers
+
+# Most specific first; anything else is a 500
+ERROR_STATUS = [(PermissionError, '403 Forbidden'), (ValueError, '400 Bad Request')]
+
+def error_response(exc, accept_encoding=''):
+    """Status, headers and body for a failed request, shared by the CGI and WSGI entry points."""
+    status = next((s for kind, s in ERROR_STATUS if isinstance(exc, kind)), '500 Internal Server Error')
+    payload, headers = encode_response({"error": str(exc), "type": type(exc).__name__}, accept_encoding)
+    return status, headers, payload
+
 # ===================== HANDLERS =====================
-def get_all_signals(conn, limit=200):
-    c = conn.cursor()
-    rows = c.execute('SELECT * FROM signals ORDER BY score DESC, id ASC LIMIT ?', (limit,)).fetchall()
-    signals = []
-    for row in rows:
-        d = dict(row)
-        d['keywords'] = [k.strip() for k in d['keywords'].split(',') if k.strip()] if d.get('keywords') else []
-        signals.append(d)
-    return signals
+def get_all_signals(conn, limit=DEFAULT_PAGE_SIZE, cursor=None, fields=DEFAULT_FIELDS):
+    return _score_page(conn, [], [], fields, cursor, limit)
 
-def get_by_sector(conn, sector):
-    c = conn.cursor()
-    rows = c.execute('SELECT * FROM signals WHERE sector=? ORDER BY score DESC', (sector,)).fetchall()
-    signals = []
-    for row in rows:
-        d = dict(row)
-        d['keywords'] = [k.strip() for k in d['keywords'].split(',') if k.strip()] if d.get('keywords') else []
-        signals.append(d)
-    return signals
+def get_by_sector(conn, sector, limit=DEFAULT_PAGE_SIZE, cursor=None, fields=DEFAULT_FIELDS):
+    return _score_page(conn, ['sector = ?'], [sector], fields, cursor, limit)
 
-def get_by_platform(conn, platform):
-    c = conn.cursor()
-    rows = c.execute('SELECT * FROM signals WHERE platform=? ORDER BY score DESC', (platform,)).fetchall()
+def get_by_platform(conn, platform, limit=DEFAULT_PAGE_SIZE, cursor=None, fields=DEFAULT_FIELDS):
+    return _score_page(conn, ['platform = ?'], [platform], fields, cursor, limit)
+
+def get_signal(conn, signal_id):
+    rows = instrument.fetch_all(conn, 'SELECT * FROM signals WHERE id = ?', (signal_id,))
+    return row_to_signal(rows[0]) if rows else None
+
+def search_signals(conn, query, mode='fts', limit=DEFAULT_PAGE_SIZE, cursor=None, fields=DEFAULT_FIELDS):
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of: {', '.join(SEARCH_MODES)}")
+    match = fts_query(query) if mode == 'fts' else ''
+    if not match:
+        return search_signals_like(conn, query, limit, cursor, fields)
+    # Keyset on (rank ASC, id ASC); bm25 is deterministic for a given index state
+    conds, params = [], [match]
+    if cursor:
+        rank, last_id = decode_cursor(cursor)
+        conds.append('rank > ? OR (rank = ? AND id > ?)')
+        params += [rank, rank, last_id]
+    # Rank ids from the index alone, then fetch columns for the page only, so the sort never
+    # carries the text of every match
+    ranked = instrument.fetch_all(conn, f'''SELECT * FROM (
+            SELECT rowid AS id, bm25(signals_fts, {', '.join(map(str, FTS_WEIGHTS))}) AS rank
+            FROM signals_fts WHERE signals_fts MATCH ?)
+        {'WHERE ' + conds[0] if conds else ''}
+        ORDER BY rank, id LIMIT ?''', params + [limit + 1])
+    next_cursor = encode_cursor(ranked[limit - 1]['rank'], ranked[limit - 1]['id']) if len(ranked) > limit else None
+    ids = [r['id'] for r in ranked[:limit]]
+    cols = ', '.join(list(fields) + [f'{c} AS _text_{c}' for c in FTS_COLUMNS])
+    rows = {}
+    for i in range(0, len(ids), 900):
+        chunk = ids[i:i + 900]
+        for row in instrument.fetch_all(conn, f'SELECT {cols} FROM signals WHERE id IN ({",".join("?" * len(chunk))})', chunk):
+            rows[row['id']] = row
     signals = []
-    for row in rows:
-        d = dict(row)
-        d['keywords'] = [k.strip() for k in d['keywords'].split(',') if k.strip()] if d.get('keywords') else []
-        signals.append(d)
-    return signals
+    with instrument.phase('convert'):
+        for signal_id in ids:
+            if signal_id not in rows:
+                continue
+            signal = row_to_signal(rows[signal_id])
+            signal['snippet'] = make_snippet([signal.pop(f'_text_{c}') for c in FTS_COLUMNS], query)
+            signals.append(signal)
+    return signals, next_cursor
 
-def search_signals(conn, query):
-    c = conn.cursor()
+def search_signals_like(conn, query, limit=DEFAULT_PAGE_SIZE, cursor=None, fields=DEFAULT_FIELDS):
     q = f'%{query}%'
-    rows = c.execute('''SELECT * FROM signals WHERE 
-        title LIKE ? OR summary LIKE ? OR keywords LIKE ? OR arabic_title LIKE ?
-        ORDER BY score DESC''', (q, q, q, q)).fetchall()
-    signals = []
-    for row in rows:
-        d = dict(row)
-        d['keywords'] = [k.strip() for k in d['keywords'].split(',') if k.strip()] if d.get('keywords') else []
-        signals.append(d)
-    return signals
+    return _score_page(conn, ['(title LIKE ? OR summary LIKE ? OR keywords LIKE ? OR arabic_title LIKE ?)'],
+                       [q, q, q, q], fields, cursor, limit)
 
 def get_stats(conn):
-    c = conn.cursor()
-    total = c.execute('SELECT COUNT(*) FROM signals').fetchone()[0]
-    high = c.execute("SELECT COUNT(*) FROM signals WHERE priority='High'").fetchone()[0]
-    sectors = c.execute('SELECT COUNT(DISTINCT sector) FROM signals').fetchone()[0]
-    platforms = c.execute('SELECT COUNT(DISTINCT platform) FROM signals').fetchone()[0]
+    row = instrument.fetch_all(conn, '''SELECT coalesce(SUM(signals), 0) AS total,
+            coalesce(SUM(CASE WHEN priority = 'High' THEN signals END), 0) AS high,
+            COUNT(DISTINCT NULLIF(sector, '')) AS sectors,
+            COUNT(DISTINCT NULLIF(platform, '')) AS platforms
+        FROM signal_totals''')[0]
     by_type = {}
-    for row in c.execute("SELECT type, COUNT(*) as cnt FROM signals GROUP BY type").fetchall():
-        by_type[row['type']] = row['cnt']
-    return {"total": total, "high_priority": high, "sectors": sectors, "platforms": platforms, "by_type": by_type}
+    for r in instrument.fetch_all(conn, "SELECT NULLIF(type, '') AS type, SUM(signals) AS cnt FROM signal_totals GROUP BY type"):
+        by_type[r['type']] = r['cnt']
+    return {"total": row['total'], "high_priority": row['high'], "sectors": row['sectors'], "platforms": row['platforms'], "by_type": by_type}
+
+def get_timeseries(conn, by='sector', days=30, until=None):
+    """Daily signal counts per `by` value over the `days` days ending at `until` (default today)."""
+    if by not in ROLLUP_DIMENSIONS:
+        raise ValueError(f"by must be one of: {', '.join(ROLLUP_DIMENSIONS)}")
+    end = date.fromisoformat(until) if until else date.today()
+    buckets = [(end - timedelta(days=i)).isoformat() for i in range(days - 1, -1, -1)]
+    index = {d: i for i, d in enumerate(buckets)}
+    series = {}
+    for r in instrument.fetch_all(conn, f'''SELECT day, {by} AS name, SUM(signals) AS cnt FROM signal_rollup
+            WHERE day BETWEEN ? AND ? GROUP BY day, {by}''', (buckets[0], buckets[-1])):
+        series.setdefault(r['name'] or None, [0] * days)[index[r['day']]] = r['cnt']
+    return {"by": by, "days": buckets, "series": series}
+
+def get_trending(conn, dim='keyword', window='7d', limit=20, min_count=2):
+    """Rank terms by how far their recent count exceeds their own 28-day baseline.
+    Reads only the trigger-maintained window totals, one row per active term."""
+    if dim not in TREND_DIMENSIONS + ['all']:
+        raise ValueError(f"dim must be one of: {', '.join(TREND_DIMENSIONS + ['all'])}")
+    if window not in ('1d', '7d'):
+        raise ValueError('window must be 1d or 7d')
+    span = 1 if window == '1d' else 7
+    col = 'd1' if span == 1 else 'd7'
+    dims = TREND_DIMENSIONS if dim == 'all' else [dim]
+    as_of = conn.execute(f'SELECT {TREND_AS_OF}').fetchone()[0]
+    topics = []
+    for r in instrument.fetch_all(conn, f'''SELECT dim, term, d1, d7, d28, m7 FROM trend_windows
+            WHERE dim IN ({",".join("?" * len(dims))}) AND {col} >= ?''', dims + [max(1, min_count)]):
+        count = r[col]
+        # Poisson z-score against the daily rate over the rest of the 28-day window
+        baseline = (r['d28'] - count) / (28 - span)
+        expected = baseline * span
+        topics.append({"dim": r['dim'], "term": r['term'], "count": count, "count_1d": r['d1'], "count_7d": r['d7'],
+                       "count_28d": r['d28'], "mentions_7d": r['m7'], "baseline_per_day": round(baseline, 3),
+                       "burst": round((count + 1) / (expected + 1), 3),
+                       "z": round((count - expected) / math.sqrt(expected + 1), 3)})
+    topics.sort(key=lambda t: (-t['z'], -t['count'], t['term']))
+    return {"as_of": as_of, "dim": dim, "window": window, "topics": topics[:limit]}
+
+# ===================== DISPATCH =====================
+VALID_ACTIONS = ["all","stats","timeseries","trending","sector","platform","search","signal","metrics","ingest","analyze"]
+WRITE_ACTIONS = {"ingest", "analyze"}
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def start_profile(action, params):
+    """Begin timing a request; ?profile=1 returns the timings in the body, ?explain=1 adds query plans."""
+    explain = params.get('explain') == '1'
+    # Unknown actions share one label so arbitrary query strings can't grow the metrics
+    return instrument.start(action if action in VALID_ACTIONS else 'unknown', params.get('profile') == '1' or explain, explain)
+
+def metrics_text(conn):
+    # CGI processes persist into api_metrics; the server also keeps its own counters in memory
+    registry = instrument.load(conn)
+    registry.merge(instrument.REGISTRY)
+    return registry.render()
+
+def handle_action(conn, action, params):
+    page = dict(limit=parse_limit(params.get('limit')), cursor=params.get('cursor') or None,
+                fields=parse_fields(params.get('fields')))
+    if action == 'all':
+        if params.get('since'):
+            try:
+                since = int(params['since'])
+            except ValueError:
+                raise ValueError('since must be an integer version')
+            return get_changes(conn, since, page['fields'])
+        # Read the version first so a concurrent write can only make it look stale, never fresh
+        version = get_version(conn)
+        signals, next_cursor = get_all_signals(conn, **page)
+        return {"signals": signals, "count": len(signals), "next_cursor": next_cursor, "version": version,
+                "timestamp": datetime.now().isoformat()}
+    elif action == 'stats':
+        return get_stats(conn)
+    elif action == 'timeseries':
+        try:
+            days = max(1, min(int(params.get('days') or 30), 366))
+        except ValueError:
+            raise ValueError('days must be an integer')
+        return get_timeseries(conn, params.get('by') or 'sector', days, params.get('until') or None)
+    elif action == 'trending':
+        try:
+            min_count = int(params.get('min_count') or 2)
+        except ValueError:
+            raise ValueError('min_count must be an integer')
+        limit = parse_limit(params.get('limit') or '20')
+        return get_trending(conn, params.get('dim') or 'keyword', params.get('window') or '7d', limit, min_count)
+    elif action == 'sector':
+        sector = params.get('sector', '')
+        signals, next_cursor = get_by_sector(conn, sector, **page)
+        return {"signals": signals, "sector": sector, "count": len(signals), "next_cursor": next_cursor}
+    elif action == 'platform':
+        platform = params.get('platform', '')
+        signals, next_cursor = get_by_platform(conn, platform, **page)
+        return {"signals": signals, "platform": platform, "count": len(signals), "next_cursor": next_cursor}
+    elif action == 'search':
+        query = params.get('q', '')
+        mode = params.get('mode', 'fts')
+        signals, next_cursor = search_signals(conn, query, mode, **page)
+        return {"signals": signals, "query": query, "mode": mode, "count": len(signals), "next_cursor": next_cursor}
+    elif action == 'signal':
+        try:
+            signal_id = int(params.get('id', ''))
+        except ValueError:
+            raise ValueError('id must be an integer')
+        signal = get_signal(conn, signal_id)
+        return {"signal": signal} if signal else {"error": "Signal not found", "id": signal_id}
+    return {"error": "Unknown action", "valid_actions": VALID_ACTIONS}
+
+def handle_read(conn, action, params, environ):
+    """Run a read action with conditional GET; returns (status, headers, body)."""
+    if action == 'metrics':
+        return '200 OK', [('Content-Type', METRICS_CONTENT_TYPE), ('Cache-Control', 'no-store')], \
+            metrics_text(conn).encode('utf-8')
+    profile = instrument.current()
+    with instrument.phase('version'):
+        etag = etag_for(conn, action, params)
+    headers = [('ETag', etag), ('Cache-Control', 'no-cache')]
+    if etag_matches(etag, environ.get('HTTP_IF_NONE_MATCH')) and not (profile and profile.capture):
+        return '304 Not Modified', headers, b''
+    result = handle_action(conn, action, params)
+    if profile and profile.capture and isinstance(result, dict):
+        result['_profile'] = profile.summary()
+    with instrument.phase('encode'):
+        payload, body_headers = encode_response(result, environ.get('HTTP_ACCEPT_ENCODING'), params.get('pretty') == '1')
+    return '200 OK', body_headers + headers, payload
+
+def check_write_token(environ):
+    """Writes fail closed: with no MARKET_INTEL_INGEST_TOKEN configured they are disabled, not open."""
+    token = os.environ.get('MARKET_INTEL_INGEST_TOKEN')
+    if not token:
+        raise PermissionError('Writes are disabled until MARKET_INTEL_INGEST_TOKEN is set')
+    if not hmac.compare_digest(environ.get('HTTP_X_INGEST_TOKEN', ''), token):
+        raise PermissionError('Invalid ingest token')
+
+def handle_ingest(conn, stream, environ):
+    """POST NDJSON posts to raw_posts; environ is os.environ under CGI or the WSGI environ."""
+    if environ.get('REQUEST_METHOD') != 'POST':
+        raise ValueError('ingest requires a POST with an NDJSON body')
+    check_write_token(environ)
+    import ingest
+    length = environ.get('CONTENT_LENGTH')
+    return ingest.ingest_stream(conn, stream, int(length) if length else None)
+
+def handle_analyze(conn, params, environ):
+    """POST to analyse recent raw_posts through the cached LLM pipeline."""
+    if environ.get('REQUEST_METHOD') != 'POST':
+        raise ValueError('analyze requires a POST')
+    check_write_token(environ)
+    import analyze
+    try:
+        since_hours = float(params.get('since_hours') or 24)
+    except ValueError:
+        raise ValueError('since_hours must be a number')
+    return analyze.run_analysis(conn, analyze.recent_posts(conn, since_hours))
+
+def handle_write(conn, action, params, stream, environ):
+    if action == 'ingest':
+        return handle_ingest(conn, stream, environ)
+    return handle_analyze(conn, params, environ)
 
 # ===================== MAIN =====================
 def main():
-    print("Content-Type: application/json")
-    print("Access-Control-Allow-Origin: *")
-    print()
-    
+    entered, t0 = time.time(), time.perf_counter()
+    cgitb.enable()
+    conn = None
     try:
-        init_db()
-        form = cgi.FieldStorage()
-        action = form.getvalue('action', 'all')
+        if os.environ.get('REQUEST_METHOD') == 'POST':
+            # The body is NDJSON, not a form; only the query string carries parameters
+            params = {k: v[0] for k, v in parse_qs(os.environ.get('QUERY_STRING', '')).items()}
+        else:
+            form = cgi.FieldStorage()
+            params = {k: form.getfirst(k) for k in form.keys()}
+        action = params.get('action', 'all')
+        # Every CGI request pays for interpreter start and imports; count it as a phase
+        profile = start_profile(action, params)
+        startup = max(0.0, entered - instrument.process_start())
+        profile.t0 = t0 - startup
+        profile.add('startup', startup)
+        with instrument.phase('init_db'):
+            init_db()
         conn = get_db()
-        
-        if action == 'all':
-            signals = get_all_signals(conn)
-            result = {"signals": signals, "count": len(signals), "timestamp": datetime.now().isoformat()}
-        elif action == 'stats':
-            result = get_stats(conn)
-        elif action == 'sector':
-            sector = form.getvalue('sector', '')
-            signals = get_by_sector(conn, sector)
-            result = {"signals": signals, "sector": sector, "count": len(signals)}
-        elif action == 'platform':
-            platform = form.getvalue('platform', '')
-            signals = get_by_platform(conn, platform)
-            result = {"signals": signals, "platform": platform, "count": len(signals)}
-        elif action == 'search':
-            query = form.getvalue('q', '')
-            signals = search_signals(conn, query)
-            result = {"signals": signals, "query": query, "count": len(signals)}
+        if action in WRITE_ACTIONS:
+            result = handle_write(conn, action, params, sys.stdin.buffer, os.environ)
+            status, (payload, headers) = '200 OK', encode_response(result, os.environ.get('HTTP_ACCEPT_ENCODING'))
         else:
-            result = {"error": "Unknown action", "valid_actions": ["all","stats","sector","platform","search"]}
-        
-        conn.close()
-        print(json.dumps(result, ensure_ascii=False, indent=2))
-    
+            status, headers, payload = handle_read(conn, action, params, os.environ)
     except Exception as e:
-        print(json.dumps({"error": str(e), "type": type(e).__name__}))
+        status, headers, payload = error_response(e, os.environ.get('HTTP_ACCEPT_ENCODING'))
+
+    profile = instrument.current()
+    if profile:
+        headers.append(('Server-Timing', profile.server_timing()))
+    out = sys.stdout.buffer
+    for name, value in [('Status', status)] + headers + [('Access-Control-Allow-Origin', '*')]:
+        out.write(f'{name}: {value}\r\n'.encode('latin-1'))
+    out.write(b'\r\n' + payload)
+    out.flush()
+    instrument.finish(status, len(payload))
+    if conn is not None:
+        if os.environ.get('MARKET_INTEL_CGI_METRICS') == '1':
+            try:
+                instrument.REGISTRY.persist(conn)
+            except sqlite3.Error:
+                pass  # metrics are best-effort; never fail a response over them
+        conn.close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+UAE Market Intelligence — Near-duplicate clustering
+Groups raw posts and signals into topic clusters with MinHash/LSH over character shingles.
+Runs incrementally: each call only signs items added since the last run and merges them into existing clusters.
+Usage: python cgi-bin/cluster.py [--db path] [--threshold 0.5] [--refresh]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import api
+import ingest
+
+# ===================== MINHASH =====================
+NUM_PERM = 64
+BANDS = 16
+SHINGLE = 5
+THRESHOLD = 0.5
+MAX_CHARS = 2000
+
+_MIX = 0x9E3779B1  # golden-ratio multiplier; spreads crc32 output before binning
+_MASK = 0xFFFFFFFF
+
+def signature(text, num_perm=NUM_PERM, k=SHINGLE):
+    """One-permutation MinHash: each shingle hash lands in one of num_perm bins and
+    every bin keeps its minimum, so a document is hashed in one pass instead of
+    num_perm passes. Empty bins borrow from the next filled bin (densification).
+    Returns None when the normalised text is shorter than one shingle (link-only or empty posts)."""
+    norm = ingest.normalize_text(text)[:MAX_CHARS]
+    if len(norm) < k:
+        return None
+    # UTF-32 keeps every character 4 bytes wide, so byte slices are character shingles
+    raw = norm.encode('utf-32-le')
+    width = 4 * k
+    shift = 32 - (num_perm.bit_length() - 1)
+    low = (1 << shift) - 1
+    mixed = sorted({(zlib.crc32(raw[i:i + width]) * _MIX) & _MASK for i in range(0, len(raw) - width + 1, 4)},
+                   reverse=True)
+    # Top bits pick the bin; iterating in descending order leaves each bin's minimum
+    best = {m >> shift: m & low for m in mixed}
+    mins = [best.get(b) for b in range(num_perm)]
+    filled = [i for i, v in enumerate(mins) if v is not None]
+    for i in range(num_perm):
+        if mins[i] is None:
+            j = next((f for f in filled if f > i), filled[0])
+            mins[i] = mins[j] + ((j - i) % num_perm) * (low + 1)
+    return array('Q', mins)
+
+def similarity(a, b):
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+def band_keys(sig, bands=BANDS):
+    rows = len(sig) // bands
+    for band in range(bands):
+        digest = hashlib.blake2b(sig[band * rows:(band + 1) * rows].tobytes(), digest_size=7).digest()
+        yield band, int.from_bytes(digest, 'big')
+
+# ===================== CLUSTER INDEX =====================
+class ClusterIndex:
+    """LSH index over persisted clusters plus the items signed in this run.
+    Candidates from shared buckets are verified against the estimated Jaccard
+    similarity before their clusters are merged (union-find on cluster ids)."""
+
+    def __init__(self, conn, threshold=THRESHOLD, bands=BANDS):
+        self.conn = conn
+        self.threshold = threshold
+        self.bands = bands
+        self.parent = {}
+        self.labels = {}
+        self.pending = []
+        self.buckets = {}
+        self.sigs = {}
+        self.clusters_of = {}
+        self.persisted = conn.execute('SELECT 1 FROM cluster_buckets LIMIT 1').fetchone() is not None
+        self.next_id = (conn.execute('SELECT MAX(id) FROM clusters').fetchone()[0] or 0) + 1
+
+    def find(self, cid):
+        root = cid
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        while cid != root:
+            self.parent[cid], cid = root, self.parent.get(cid, cid)
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # Keep the older (smaller) id so persisted clusters stay stable
+            self.parent[max(ra, rb)] = min(ra, rb)
+        return min(ra, rb)
+
+    def _candidates(self, keys):
+        found = set()
+        for key in keys:
+            found.update(self.buckets.get(key, ()))
+            if self.persisted:
+                found.update(self.conn.execute(
+                    'SELECT item_type, item_id FROM cluster_buckets WHERE band = ? AND bucket = ?', key).fetchall())
+        return found
+
+    def _signature_of(self, item):
+        sig = self.sigs.get(item)
+        if sig is None:
+            row = self.conn.execute('SELECT cluster_id, signature FROM cluster_items WHERE item_type = ? AND item_id = ?',
+                                    item).fetchone()
+            sig = array('Q')
+            sig.frombytes(row[1])
+            self.clusters_of[item] = row[0]
+        return sig
+
+    def add(self, item_type, item_id, sig, label=''):
+        """Items without a signature get a singleton cluster and are never bucketed, so they can't merge."""
+        item = (item_type, item_id)
+        keys = list(band_keys(sig, self.bands)) if sig is not None else []
+        cluster = None
+        for cand in self._candidates(keys):
+            if similarity(sig, self._signature_of(cand)) >= self.threshold:
+                cid = self.find(self.clusters_of[cand])
+                cluster = cid if cluster is None else self.union(cluster, cid)
+        if cluster is None:
+            cluster = self.next_id
+            self.next_id += 1
+            self.labels[cluster] = label[:200]
+        self.sigs[item] = sig if sig is not None else array('Q')
+        self.clusters_of[item] = cluster
+        for key in keys:
+            self.buckets.setdefault(key, []).append(item)
+        self.pending.append((item, keys))
+        return cluster
+
+    def flush(self):
+        """Write this run's items and merges; returns the touched cluster ids."""
+        c = self.conn
+        merged = {cid for cid in self.parent if self.find(cid) != cid}
+        for old in merged:
+            c.execute('UPDATE cluster_items SET cluster_id = ? WHERE cluster_id = ?', (self.find(old), old))
+            c.execute('UPDATE signals SET cluster_id = ? WHERE cluster_id = ?', (self.find(old), old))
+            c.execute('DELETE FROM clusters WHERE id = ?', (old,))
+        c.executemany('INSERT INTO clusters (id, label) VALUES (?, ?) ON CONFLICT (id) DO NOTHING',
+                      [(cid, label) for cid, label in self.labels.items() if cid not in merged])
+        c.executemany('INSERT OR REPLACE INTO cluster_items (item_type, item_id, cluster_id, signature) VALUES (?,?,?,?)',
+                      [(t, i, self.find(self.clusters_of[(t, i)]), self.sigs[(t, i)].tobytes())
+                       for (t, i), _ in self.pending])
+        c.executemany('INSERT OR IGNORE INTO cluster_buckets (band, bucket, item_type, item_id) VALUES (?,?,?,?)',
+                      [(band, bucket, t, i) for (t, i), keys in self.pending for band, bucket in keys])
+        touched = {self.find(self.clusters_of[item]) for item, _ in self.pending}
+        self.pending, self.labels = [], {}
+        return touched
+
+# ===================== PIPELINE =====================
+def refresh_sizes(conn, cluster_ids=None):
+    """Recompute size and mention totals (posts weighted by the days they were collected on), then
+    raise signals.mentions to their cluster's total and record the cluster id."""
+    ids = sorted(cluster_ids) if cluster_ids is not None else None
+    chunks = [ids[i:i + 900] for i in range(0, len(ids), 900)] if ids is not None else [None]
+    for chunk in chunks:
+        where = f'WHERE id IN ({",".join("?" * len(chunk))})' if chunk else ''
+        conn.execute(f'''UPDATE clusters SET
+                size = (SELECT COUNT(*) FROM cluster_items ci WHERE ci.cluster_id = clusters.id),
+                mentions = (SELECT coalesce(SUM(CASE WHEN ci.item_type = 'post' THEN coalesce(p.mentions, 1) ELSE 1 END), 0)
+                            FROM cluster_items ci LEFT JOIN raw_posts p ON ci.item_type = 'post' AND p.id = ci.item_id
+                            WHERE ci.cluster_id = clusters.id),
+                updated_at = CURRENT_TIMESTAMP
+            {where}''', chunk or [])
+        in_clusters = f'AND ci.cluster_id IN ({",".join("?" * len(chunk))})' if chunk else ''
+        conn.execute(f'''UPDATE signals SET
+                cluster_id = ci.cluster_id,
+                mentions = max(coalesce(signals.mentions, 0), c.mentions)
+            FROM cluster_items ci JOIN clusters c ON c.id = ci.cluster_id
+            WHERE ci.item_type = 'signal' AND ci.item_id = signals.id {in_clusters}''', chunk or [])
+
+def _watermark(conn, key):
+    row = conn.execute('SELECT value FROM metadata WHERE key = ?', (key,)).fetchone()
+    return int(row[0]) if row else 0
+
+def _set_watermark(conn, key, value):
+    conn.execute('INSERT OR REPLACE INTO metadata (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)', (key, str(value)))
+
+def update_clusters(conn, threshold=THRESHOLD, batch_size=20000, workers=1):
+    """Cluster every post and signal added since the last run; returns run metrics.
+    Signing is the CPU-bound part, so `workers` > 1 signs each batch in a process pool."""
+    t0 = time.perf_counter()
+    index = ClusterIndex(conn, threshold)
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    sign = (lambda texts: pool.map(signature, texts, chunksize=256)) if pool else (lambda texts: map(signature, texts))
+    sources = [
+        ('signal', 'cluster_last_signal_id',
+         "SELECT id, title, coalesce(title,'') || ' ' || coalesce(summary,'') || ' ' || coalesce(raw_text,'') FROM signals WHERE id > ? ORDER BY id LIMIT ?"),
+        ('post', 'cluster_last_post_id',
+         "SELECT id, coalesce(nullif(title,''), substr(body, 1, 120)), coalesce(title,'') || ' ' || coalesce(body,'') FROM raw_posts WHERE id > ? ORDER BY id LIMIT ?"),
+    ]
+    counts, touched = {}, set()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for item_type, mark_key, sql in sources:
+            last = _watermark(conn, mark_key)
+            counts[item_type] = 0
+            while True:
+                rows = conn.execute(sql, (last, batch_size)).fetchall()
+                if not rows:
+                    break
+                for (item_id, label, _), sig in zip(rows, sign([r[2] for r in rows])):
+                    index.add(item_type, item_id, sig, label or '')
+                last = rows[-1][0]
+                counts[item_type] += len(rows)
+            touched |= index.flush()
+            _set_watermark(conn, mark_key, last)
+        refresh_sizes(conn, touched)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        if pool:
+            pool.shutdown()
+    elapsed = time.perf_counter() - t0
+    items = sum(counts.values())
+    return {"posts": counts['post'], "signals": counts['signal'], "clusters_touched": len(touched),
+            "seconds": round(elapsed, 3), "items_per_sec": round(items / elapsed, 1) if elapsed else None}
+
+# ===================== CLI =====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Incrementally cluster raw posts and signals')
+    parser.add_argument('--db', default=None, help='SQLite path (defaults to api.DB_PATH)')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='estimated Jaccard needed to merge')
+    parser.add_argument('--workers', type=int, default=1, help='processes used to compute signatures')
+    parser.add_argument('--refresh', action='store_true', help='recompute every cluster size (after re-ingests)')
+    args = parser.parse_args(argv)
+
+    if args.db:
+        api.DB_PATH = args.db
+    api.init_db()
+    conn = api.get_db()
+    report = update_clusters(conn, args.threshold, workers=args.workers)
+    if args.refresh:
+        refresh_sizes(conn)
+        conn.commit()
+    conn.close()
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
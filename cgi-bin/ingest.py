@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+UAE Market Intelligence — Bulk ingestion
+Loads NDJSON posts in the workflow's normalised schema into raw_posts with batched, deduplicating upserts
+Usage: python cgi-bin/ingest.py [posts.ndjson ...]   (reads stdin when no files are given)
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import api
+
+# ===================== NORMALISATION =====================
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|ref_src)$')
+BATCH_SIZE = 5000
+MAX_ERRORS = 20
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+def normalize_url(url):
+    url = str(url or '').strip()
+    if not url:
+        return ''
+    try:
+        parts = urlsplit(url)
+    except ValueError as e:
+        raise ValueError(f'invalid url: {e}')
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not TRACKING_PARAMS.match(k)))
+    return urlunsplit((parts.scheme.lower() or 'https', host, parts.path.rstrip('/'), query, ''))
+
+def normalize_text(text):
+    """Casefolded, Arabic-folded word sequence; punctuation and spacing do not affect the hash."""
+    return ' '.join(re.findall(r'\w+', api.fold_arabic(text or '').casefold()))
+
+def content_hash(title, body):
+    return hashlib.sha1(f'{normalize_text(title)}\n{normalize_text(body)}'.encode('utf-8')).hexdigest()
+
+def _int(value):
+    """Counts as SQLite integers: unparseable values are 0, huge or infinite ones clamp to 64 bits."""
+    try:
+        number = float(value)
+    except OverflowError:  # an integer beyond float range
+        number = math.inf if value > 0 else -math.inf
+    except (TypeError, ValueError):
+        return 0
+    if math.isnan(number):
+        return 0
+    if math.isinf(number):
+        return INT64_MAX if number > 0 else INT64_MIN
+    return max(INT64_MIN, min(int(round(number)), INT64_MAX))
+
+def _text(post, field, default=''):
+    """A field as text; lone surrogates (valid JSON, invalid UTF-8) would fail the whole batch in SQLite."""
+    value = str(post.get(field) or default)
+    try:
+        value.encode('utf-8')
+    except UnicodeEncodeError:
+        raise ValueError(f'{field} is not valid UTF-8')
+    return value
+
+def prepare_post(post):
+    """Map one normalised post to an upsert row; the dedupe key is the canonical URL when there is one."""
+    if not isinstance(post, dict):
+        raise ValueError('record is not a JSON object')
+    title, body = _text(post, 'title'), _text(post, 'body')
+    url = normalize_url(_text(post, 'url'))
+    chash = content_hash(title, body)
+    if not url and not normalize_text(title + ' ' + body):
+        raise ValueError('record has neither url nor text')
+    key = hashlib.sha1((f'url:{url}' if url else f'text:{chash}').encode('utf-8')).hexdigest()
+    collected_at = _text(post, 'collected_at') or datetime.now().isoformat()
+    return (key, chash, _text(post, 'source', 'Unknown'), _text(post, 'subreddit'), title, body,
+            _text(post, 'author'), _int(post.get('score')), _int(post.get('comments')),
+            url, _text(post, 'language'), collected_at, collected_at)
+
+# ===================== UPSERT =====================
+# A conflict counts as a new mention only when it was collected on a later day than the stored row,
+# so retried or repeated deliveries of the same collection run don't inflate mentions
+UPSERT_SQL = '''INSERT INTO raw_posts
+    (dedupe_key, content_hash, source, subreddit, title, body, author, score, comments, url, language, collected_at, first_seen)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
+    ON CONFLICT (dedupe_key) DO UPDATE SET
+        mentions = mentions + (substr(excluded.collected_at, 1, 10) > coalesce(substr(collected_at, 1, 10), '')),
+        score = max(score, excluded.score),
+        comments = max(comments, excluded.comments),
+        collected_at = max(collected_at, excluded.collected_at)'''
+
+def _existing_keys(conn, keys):
+    found = set()
+    for i in range(0, len(keys), 900):
+        chunk = keys[i:i + 900]
+        found.update(r[0] for r in conn.execute(
+            f'SELECT dedupe_key FROM raw_posts WHERE dedupe_key IN ({",".join("?" * len(chunk))})', chunk))
+    return found
+
+def ingest_posts(conn, records, batch_size=BATCH_SIZE):
+    """Upsert (lineno, post) pairs in one transaction; returns counts and throughput."""
+    t0 = time.perf_counter()
+    report = {"received": 0, "inserted": 0, "updated": 0, "rejected": 0, "errors": []}
+    seen = set()
+
+    def flush(batch):
+        keys = [r[0] for r in batch]
+        existing = _existing_keys(conn, [k for k in set(keys) if k not in seen])
+        for k in keys:
+            if k in seen or k in existing:
+                report['updated'] += 1
+            else:
+                report['inserted'] += 1
+                seen.add(k)
+        seen.update(existing)
+        conn.executemany(UPSERT_SQL, batch)
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        batch = []
+        for lineno, post in records:
+            report['received'] += 1
+            try:
+                if isinstance(post, ValueError):
+                    raise ValueError(f'invalid JSON: {post}')
+                batch.append(prepare_post(post))
+            except ValueError as e:
+                report['rejected'] += 1
+                if len(report['errors']) < MAX_ERRORS:
+                    report['errors'].append({"line": lineno, "error": str(e)})
+                continue
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    elapsed = time.perf_counter() - t0
+    report['seconds'] = round(elapsed, 4)
+    report['rows_per_sec'] = round((report['received'] - report['rejected']) / elapsed, 1) if elapsed else None
+    return report
+
+def iter_ndjson(stream, length=None):
+    """Yield (lineno, record) from a binary NDJSON stream, reading at most `length` bytes.
+    Malformed lines yield the ValueError instead so they are reported, not fatal."""
+    if length is not None:
+        lines = stream.read(length).splitlines()
+    else:
+        lines = stream
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield lineno, json.loads(line)
+        except ValueError as e:
+            yield lineno, e
+
+def ingest_stream(conn, stream, length=None, batch_size=BATCH_SIZE):
+    return ingest_posts(conn, iter_ndjson(stream, length), batch_size)
+
+# ===================== CLI =====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-load NDJSON posts into raw_posts')
+    parser.add_argument('files', nargs='*', help='NDJSON files (default: stdin)')
+    parser.add_argument('--db', default=None, help='SQLite path (defaults to api.DB_PATH)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.db:
+        api.DB_PATH = args.db
+    api.init_db()
+    conn = api.get_db()
+    reports = []
+    for path in args.files or ['-']:
+        if path == '-':
+            reports.append(ingest_stream(conn, sys.stdin.buffer, batch_size=args.batch_size))
+        else:
+            with open(path, 'rb') as f:
+                reports.append(ingest_stream(conn, f, batch_size=args.batch_size))
+    conn.close()
+    print(json.dumps(reports[0] if len(reports) == 1 else reports, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+UAE Market Intelligence — Request instrumentation
+Per-request phase timings, row and byte counts, opt-in EXPLAIN QUERY PLAN capture,
+Prometheus-format latency histograms and a slow-query log
+Usage: imported by api.py and server.py; see ?action=metrics and ?profile=1[&explain=1]
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# ===================== CONFIG =====================
+SLOW_QUERY_MS = float(os.environ.get('MARKET_INTEL_SLOW_MS') or 200)
+SLOW_LOG = os.environ.get('MARKET_INTEL_SLOW_LOG')  # JSON lines file; stderr when unset
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BYTES_BUCKETS = (512, 2048, 8192, 32768, 131072, 524288, 2097152)
+PREFIX = 'market_intel_'
+HELP = {
+    'requests_total': ('counter', 'Requests by action and HTTP status'),
+    'request_duration_seconds': ('histogram', 'Wall-clock time per request'),
+    'phase_duration_seconds': ('histogram', 'Time per request phase (startup, init_db, query, convert, encode, ...)'),
+    'response_bytes': ('histogram', 'Response body size after encoding'),
+    'rows_total': ('counter', 'Rows returned by SQL queries'),
+    'slow_queries_total': ('counter', 'Statements slower than MARKET_INTEL_SLOW_MS'),
+}
+
+_IMPORTED_AT = time.time()
+
+def process_start():
+    """Wall-clock time the interpreter started (Linux /proc), else when this module was imported."""
+    try:
+        with open('/proc/self/stat') as f:
+            ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return _IMPORTED_AT
+
+# ===================== PROFILE =====================
+_local = threading.local()
+
+class Profile:
+    """Timings for one request. Phases are leaf spans and never nest, so together with
+    'other' they add up to the request's wall-clock time."""
+
+    def __init__(self, action='', capture=False, explain=False):
+        self.action = action
+        self.capture = capture
+        self.explain = explain
+        self.t0 = time.perf_counter()
+        self.phases = {}
+        self.rows = 0
+        self.queries = []
+        self.total = None
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def elapsed(self):
+        return self.total if self.total is not None else time.perf_counter() - self.t0
+
+    def summary(self):
+        return {"action": self.action, "total_ms": round(self.elapsed() * 1000, 3), "rows": self.rows,
+                "phases_ms": {k: round(v * 1000, 3) for k, v in self.phases.items()}, "queries": self.queries}
+
+    def server_timing(self):
+        return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.phases.items())
+
+def start(action='', capture=False, explain=False):
+    profile = Profile(action, capture, explain)
+    _local.profile = profile
+    return profile
+
+def current():
+    return getattr(_local, 'profile', None)
+
+@contextmanager
+def phase(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile = current()
+        if profile:
+            profile.add(name, time.perf_counter() - t0)
+
+def finish(status, nbytes):
+    """Close the current profile and record it in REGISTRY; returns the profile."""
+    profile = current()
+    if profile is None:
+        return None
+    _local.profile = None
+    profile.total = time.perf_counter() - profile.t0
+    profile.add('other', max(0.0, profile.total - sum(profile.phases.values())))
+    REGISTRY.record(profile, str(status).split()[0], nbytes)
+    return profile
+
+# ===================== QUERIES =====================
+def explain(conn, sql, params=()):
+    return [r[3] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+
+def fetch_all(conn, sql, params=()):
+    """conn.execute(sql, params).fetchall(), timed into the current profile's 'query' phase.
+    Statements over SLOW_QUERY_MS go to the slow-query log together with their plan."""
+    t0 = time.perf_counter()
+    rows = conn.execute(sql, params).fetchall()
+    ms = (time.perf_counter() - t0) * 1000
+    profile = current()
+    action = profile.action if profile else ''
+    if profile:
+        profile.add('query', ms / 1000)
+        profile.rows += len(rows)
+    slow = ms >= SLOW_QUERY_MS
+    if slow or (profile and profile.capture):
+        entry = {"sql": ' '.join(sql.split()), "ms": round(ms, 3), "rows": len(rows)}
+        if slow or (profile and profile.explain):
+            entry['plan'] = explain(conn, sql, params)
+        if profile and profile.capture:
+            profile.queries.append(entry)
+        if slow:
+            REGISTRY.inc('slow_queries_total', {"action": action})
+            log_slow(dict(entry, action=action, params=[p if isinstance(p, (int, float)) else str(p)[:200] for p in params]))
+    return rows
+
+def log_slow(entry):
+    line = json.dumps(dict(entry, at=datetime.now().isoformat(timespec='seconds')), ensure_ascii=False) + '\n'
+    if SLOW_LOG:
+        with open(SLOW_LOG, 'a', encoding='utf-8') as f:
+            f.write(line)
+    else:
+        sys.stderr.write(line)
+
+# ===================== REGISTRY =====================
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+class Registry:
+    """Thread-safe counters and fixed-bucket histograms rendered in Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, by=1):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + by
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = _key(name, labels)
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = {"buckets": list(buckets), "counts": [0] * (len(buckets) + 1), "sum": 0.0}
+            i = next((i for i, b in enumerate(h['buckets']) if value <= b), len(h['buckets']))
+            h['counts'][i] += 1
+            h['sum'] += value
+
+    def record(self, profile, status, nbytes):
+        labels = {"action": profile.action or 'unknown'}
+        self.inc('requests_total', dict(labels, status=status))
+        self.inc('rows_total', labels, profile.rows)
+        self.observe('request_duration_seconds', labels, profile.total)
+        self.observe('response_bytes', labels, nbytes, BYTES_BUCKETS)
+        for name, seconds in profile.phases.items():
+            self.observe('phase_duration_seconds', dict(labels, phase=name), seconds)
+
+    def snapshot(self):
+        """Copies of the counters and histograms, taken under this registry's lock."""
+        with self.lock:
+            return dict(self.counters), {key: {"buckets": list(h['buckets']), "counts": list(h['counts']), "sum": h['sum']}
+                                         for key, h in self.histograms.items()}
+
+    def merge(self, other):
+        # Copy first: other's request threads keep adding keys, and holding both locks could deadlock
+        counters, histograms = other.snapshot()
+        with self.lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, h in histograms.items():
+                mine = self.histograms.get(key)
+                if mine is None or mine['buckets'] != h['buckets']:
+                    self.histograms[key] = h
+                else:
+                    mine['counts'] = [a + b for a, b in zip(mine['counts'], h['counts'])]
+                    mine['sum'] += h['sum']
+
+    def render(self):
+        def labelstr(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            esc = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            return '{' + ','.join(f'{k}="{esc(v)}"' for k, v in pairs) + '}'
+
+        with self.lock:
+            series = {}
+            for (name, labels), value in self.counters.items():
+                series.setdefault(name, []).append((labels, value))
+            for (name, labels), h in self.histograms.items():
+                series.setdefault(name, []).append((labels, h))
+            lines = []
+            for name in sorted(series):
+                kind, text = HELP.get(name, ('untyped', name))
+                lines += [f'# HELP {PREFIX}{name} {text}', f'# TYPE {PREFIX}{name} {kind}']
+                for labels, value in sorted(series[name], key=lambda s: s[0]):
+                    if kind != 'histogram':
+                        lines.append(f'{PREFIX}{name}{labelstr(labels)} {value}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value['buckets'] + ['+Inf'], value['counts']):
+                        cumulative += count
+                        lines.append(f'{PREFIX}{name}_bucket{labelstr(labels, [("le", bound)])} {cumulative}')
+                    lines.append(f'{PREFIX}{name}_sum{labelstr(labels)} {value["sum"]:.6f}')
+                    lines.append(f'{PREFIX}{name}_count{labelstr(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    # CGI requests live in separate processes, so they merge into a SQLite table instead
+    def persist(self, conn):
+        with self.lock:
+            rows = [('counter', name, json.dumps(labels), json.dumps(value))
+                    for (name, labels), value in self.counters.items()]
+            rows += [('histogram', name, json.dumps(labels), json.dumps(h))
+                     for (name, labels), h in self.histograms.items()]
+            self.counters, self.histograms = {}, {}
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            stored = load(conn)
+            pending = Registry()
+            for kind, name, labels, data in rows:
+                key = (name, tuple(tuple(p) for p in json.loads(labels)))
+                (pending.counters if kind == 'counter' else pending.histograms)[key] = json.loads(data)
+            stored.merge(pending)
+            conn.executemany('INSERT OR REPLACE INTO api_metrics (kind, name, labels, data) VALUES (?, ?, ?, ?)',
+                             [('counter', n, json.dumps(l), json.dumps(v)) for (n, l), v in stored.counters.items()] +
+                             [('histogram', n, json.dumps(l), json.dumps(h)) for (n, l), h in stored.histograms.items()])
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+def load(conn):
+    registry = Registry()
+    for kind, name, labels, data in conn.execute('SELECT kind, name, labels, data FROM api_metrics').fetchall():
+        key = (name, tuple(tuple(p) for p in json.loads(labels)))
+        (registry.counters if kind == 'counter' else registry.histograms)[key] = json.loads(data)
+    return registry
+
+REGISTRY = Registry()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+UAE Market Intelligence — Persistent API server
+Serves the same actions as api.py from one long-running process (stdlib WSGI)
+Usage: python cgi-bin/server.py --port 8001 [--pool 4] [--db path/to/market_intel.db]
+"""
+
+import argparse
+import os
+import queue
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import api
+import instrument
+
+# ===================== CONNECTION POOL =====================
+class ConnectionPool:
+    """Bounded set of reusable read-only SQLite connections."""
+
+    def __init__(self, path, size=4):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._idle.put(self._connect())
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA query_only = 1')
+        return conn
+
+    @contextmanager
+    def connection(self, timeout=10):
+        conn = self._idle.get(timeout=timeout)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+# ===================== WSGI APP =====================
+def make_app(pool):
+    def app(environ, start_response):
+        params = {k: v[0] for k, v in parse_qs(environ.get('QUERY_STRING', '')).items()}
+        action = params.get('action', 'all')
+        accept = environ.get('HTTP_ACCEPT_ENCODING')
+        profile = api.start_profile(action, params)
+        try:
+            if action in api.WRITE_ACTIONS:
+                # Writes use their own connection; the pool is read-only
+                conn = api.get_db()
+                try:
+                    result = api.handle_write(conn, action, params, environ['wsgi.input'], environ)
+                finally:
+                    conn.close()
+                status, (payload, headers) = '200 OK', api.encode_response(result, accept)
+            else:
+                t0 = time.perf_counter()
+                with pool.connection() as conn:
+                    profile.add('pool_wait', time.perf_counter() - t0)
+                    status, headers, payload = api.handle_read(conn, action, params, environ)
+        except Exception as e:
+            status, headers, payload = api.error_response(e, accept)
+        headers = headers + [('Server-Timing', profile.server_timing())]
+        instrument.finish(status, len(payload))
+        start_response(status, headers + [
+            ('Access-Control-Allow-Origin', '*'),
+            ('Content-Length', str(len(payload))),
+        ])
+        return [payload]
+    return app
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+# ===================== MAIN =====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Persistent UAE Market Intel API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--pool', type=int, default=4, help='number of pooled read connections')
+    parser.add_argument('--db', default=None, help='SQLite path (defaults to api.DB_PATH)')
+    parser.add_argument('--access-log', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.db:
+        api.DB_PATH = args.db
+    api.init_db()
+    pool = ConnectionPool(api.DB_PATH, size=args.pool)
+    handler = WSGIRequestHandler if args.access_log else QuietHandler
+    httpd = make_server(args.host, args.port, make_app(pool),
+                        server_class=ThreadingWSGIServer, handler_class=handler)
+    print(f'Serving UAE Market Intel API on http://{args.host}:{args.port} (pool={args.pool})', flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        pool.close()
+
+if __name__ == '__main__':
+    main()